@@ -0,0 +1,205 @@
+# ------------------------------
+# souly 매칭 API 서버 (JSON over HTTP)
+#   python api.py --host 127.0.0.1 --port 8600
+#   SOULY_API_URL=http://127.0.0.1:8600 streamlit run main.py
+# main.py 의 service_* 함수(같은 저장소 / 같은 점수 계산)를 그대로 내보낸다.
+# 연결은 asyncio 로 받고, 점수 계산·저장처럼 막히는 일은 스레드 풀에서 돌린다.
+# ------------------------------
+import argparse
+import asyncio
+import json
+import logging
+import os
+import re
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+
+import main
+
+logger = logging.getLogger("souly.api")
+
+API_WORKERS = int(os.environ.get("SOULY_API_WORKERS", 4))
+MAX_BODY = 1 << 20  # 요청 본문 최대 크기 (1MB)
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 413: "Payload Too Large", 500: "Internal Server Error"}
+
+
+def _health(match, query, body):
+    return {"ok": True}
+
+
+def _version(match, query, body):
+    return main.service_version()
+
+
+def _get_profile(match, query, body):
+    profile = main.service_profile(match["user_id"])
+    if profile is None:
+        raise main.UnknownUser(match["user_id"])
+    return profile
+
+
+def _put_profile(match, query, body):
+    if str(body.get("user_id", match["user_id"])) != match["user_id"]:
+        raise ValueError("경로와 본문의 user_id 가 다릅니다")
+    return main.service_save_profile(dict(body, user_id=match["user_id"]))
+
+
+def _candidates(match, query, body):
+    try:
+        limit = int(query.get("limit", main.MATCH_LIST_MAX))
+    except ValueError:
+        raise ValueError("limit 은 정수여야 합니다")
+    how = query.get("how", "mean")
+    if how not in main.TEAM_AGGREGATES.values():
+        raise ValueError(f"how 는 {', '.join(main.TEAM_AGGREGATES.values())} 중 하나여야 합니다")
+    return main.service_match_list(match["user_id"], max(1, min(limit, main.MATCH_LIST_MAX)), how)
+
+
+def _decisions(match, query, body):
+    return main.service_decisions(match["user_id"])
+
+
+def _post_decision(match, query, body):
+    return main.service_decide(body)
+
+
+def _notifications(match, query, body):
+    return main.service_notifications(match["user_id"])
+
+
+def _post_rating(match, query, body):
+    return main.service_rate(body)
+
+
+ROUTES = [
+    ("GET", r"/health", _health),
+    ("GET", r"/version", _version),
+    ("GET", r"/profiles/(?P<user_id>[^/]+)", _get_profile),
+    ("PUT", r"/profiles/(?P<user_id>[^/]+)", _put_profile),
+    ("GET", r"/users/(?P<user_id>[^/]+)/candidates", _candidates),
+    ("GET", r"/users/(?P<user_id>[^/]+)/decisions", _decisions),
+    ("POST", r"/decisions", _post_decision),
+    ("GET", r"/users/(?P<user_id>[^/]+)/notifications", _notifications),
+    ("POST", r"/ratings", _post_rating),
+]
+ROUTES = [(method, re.compile(pattern + "$"), handler) for method, pattern, handler in ROUTES]
+
+
+def dispatch(method, target, raw_body):
+    # (상태 코드, JSON 으로 보낼 값). 없는 사용자는 404, 잘못된 입력은 400.
+    parsed = urllib.parse.urlsplit(target)
+    query = dict(urllib.parse.parse_qsl(parsed.query))
+    allowed = False
+    for route_method, pattern, handler in ROUTES:
+        found = pattern.match(parsed.path)
+        if found is None:
+            continue
+        allowed = True
+        if route_method != method:
+            continue
+        match = {k: urllib.parse.unquote(v) for k, v in found.groupdict().items()}
+        try:
+            body = json.loads(raw_body.decode("utf-8")) if raw_body else {}
+            if not isinstance(body, dict):
+                raise ValueError("본문은 JSON 객체여야 합니다")
+            return 200, handler(match, query, body)
+        except main.UnknownUser as e:
+            return 404, {"error": f"없는 사용자: {e.args[0] if e.args else ''}"}
+        except (ValueError, UnicodeDecodeError) as e:
+            return 400, {"error": str(e)}
+        except Exception:
+            logger.exception("%s %s 처리 실패", method, target)
+            return 500, {"error": "서버 오류"}
+    if allowed:
+        return 405, {"error": "지원하지 않는 메서드"}
+    return 404, {"error": "없는 경로"}
+
+
+async def _read_request(reader):
+    # 요청 한 개: (method, target, headers, body). 연결이 닫혔으면 None.
+    line = await reader.readline()
+    if not line:
+        return None
+    parts = line.decode("latin-1").split()
+    if len(parts) != 3:
+        raise ValueError("잘못된 요청 줄")
+    method, target, version = parts
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    length = int(headers.get("content-length") or 0)
+    if length > MAX_BODY:
+        raise OverflowError(length)
+    body = await reader.readexactly(length) if length else b""
+    return method.upper(), target, version, headers, body
+
+
+def _response(status, payload, keep_alive):
+    data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+    head = (
+        f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+        "Content-Type: application/json; charset=utf-8\r\n"
+        f"Content-Length: {len(data)}\r\n"
+        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+    )
+    return head.encode("latin-1") + data
+
+
+class ApiServer:
+    def __init__(self, workers=API_WORKERS):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="souly-api")
+
+    async def handle(self, reader, writer):
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                try:
+                    request = await _read_request(reader)
+                except OverflowError:
+                    writer.write(_response(413, {"error": "본문이 너무 큽니다"}, False))
+                    break
+                except (ValueError, asyncio.IncompleteReadError):
+                    writer.write(_response(400, {"error": "잘못된 HTTP 요청"}, False))
+                    break
+                if request is None:
+                    break
+                method, target, version, headers, body = request
+                keep_alive = headers.get("connection", "").lower() != "close" and version == "HTTP/1.1"
+                status, payload = await loop.run_in_executor(self.executor, dispatch, method, target, body)
+                writer.write(_response(status, payload, keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host, port):
+        server = await asyncio.start_server(self.handle, host, port)
+        logger.info("souly API: http://%s:%s", host, port)
+        async with server:
+            await server.serve_forever()
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="souly 매칭 API 서버")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8600)
+    parser.add_argument("--workers", type=int, default=API_WORKERS, help="점수 계산·저장을 돌릴 스레드 수")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    # Streamlit 화면 없이 cache_resource 를 부를 때마다 나오는 경고는 끈다
+    logging.getLogger("streamlit.runtime.scriptrunner_utils.script_run_context").setLevel(logging.ERROR)
+    try:
+        asyncio.run(ApiServer(args.workers).serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1 @@
+# 매칭 파이프라인 벤치마크 (python -m bench.run)
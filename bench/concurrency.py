@@ -0,0 +1,154 @@
+# ------------------------------
+# 동시 세션 쓰기 벤치마크
+#   python -m bench.concurrency --size 2000 --workers 4 --ops 50
+# 여러 프로세스가 같은 저장소에 동시에 ♥/패스, 별점, 프로필 저장, 결정 표 통째로 고쳐 쓰기를 한다.
+# 초당 처리 수와 함께, 끝난 뒤 저장소를 다시 읽어서 빠진 쓰기(lost)가 없는지 센다.
+# ------------------------------
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import tempfile
+import time
+
+import pandas as pd
+
+import main
+from bench.synth import BASE_TIME, generate_profiles, write_dataset
+
+SCENARIOS = ("upsert_decision", "upsert_rating", "upsert_profile", "update_decisions")
+
+
+def _decision(worker, i):
+    return {
+        "timestamp": BASE_TIME.isoformat(),
+        "from_user": f"bench{worker}",
+        "to_user": f"user{i}",
+        "decision": "수락" if i % 2 else "거절",
+    }
+
+
+def _run_ops(scenario, worker, ops, profiles):
+    for i in range(ops):
+        if scenario == "upsert_decision":
+            main.upsert_decision(_decision(worker, i))
+        elif scenario == "upsert_rating":
+            main.upsert_rating({**_decision(worker, i), "rating": 1 + i % 10})
+        elif scenario == "upsert_profile":
+            row = profiles.iloc[i].to_dict()
+            row["user_id"] = f"bench{worker}_{i}"
+            main.upsert_profile(row)
+        else:
+            # 예전 화면 코드처럼 표를 읽고 한 줄 붙여 통째로 저장하는 경로
+            row = pd.DataFrame([_decision(worker, i)])
+            main.update_table("decisions", lambda df: pd.concat([df, row], ignore_index=True))
+    # 뒤에서 쓰는 ♥/별점도 끝나기 전에 저장소까지 내려 보낸다 (자식 프로세스는 atexit 을 안 돈다)
+    main.flush_writes()
+
+
+def _worker(workdir, scenario, worker, ops, barrier, out):
+    os.chdir(workdir)
+    main.get_storage.clear()
+    main.get_table_cache().invalidate()
+    main.load_data()
+    profiles = generate_profiles(ops, seed=1000 + worker)
+    barrier.wait()
+    started = time.perf_counter()
+    error = None
+    try:
+        _run_ops(scenario, worker, ops, profiles)
+    except Exception as e:
+        # 부모가 결과를 기다리다 멈추지 않게 실패도 알려 준다
+        error = repr(e)
+    out.put((worker, time.perf_counter() - started, error))
+
+
+def _written(scenario, workers, ops):
+    main.get_table_cache().invalidate()
+    if scenario == "upsert_profile":
+        ids = set(main.load_data()["user_id"])
+        return sum(f"bench{w}_{i}" in ids for w in range(workers) for i in range(ops))
+    df = main.load_ratings() if scenario == "upsert_rating" else main.load_decisions()
+    pairs = set(zip(df["from_user"], df["to_user"]))
+    return sum((f"bench{w}", f"user{i}") in pairs for w in range(workers) for i in range(ops))
+
+
+def run_scenario(scenario, size, workers, ops, seed):
+    ctx = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory(prefix="souly-conc-") as workdir:
+        cwd = os.getcwd()
+        os.chdir(workdir)
+        main.get_storage.clear()
+        try:
+            write_dataset(size, seed=seed)
+            barrier = ctx.Barrier(workers + 1)
+            out = ctx.Queue()
+            procs = [
+                ctx.Process(target=_worker, args=(workdir, scenario, w, ops, barrier, out))
+                for w in range(workers)
+            ]
+            for p in procs:
+                p.start()
+            barrier.wait()
+            started = time.perf_counter()
+            per_worker = [out.get() for _ in procs]
+            elapsed = time.perf_counter() - started
+            for p in procs:
+                p.join()
+            written = _written(scenario, workers, ops)
+        finally:
+            os.chdir(cwd)
+            main.get_storage.clear()
+            main.get_table_cache().invalidate()
+    total = workers * ops
+    entry = {
+        "scenario": scenario,
+        "size": size,
+        "workers": workers,
+        "ops": total,
+        "elapsed_s": elapsed,
+        "ops_per_s": total / elapsed,
+        "worker_max_s": max(t for _, t, _ in per_worker),
+        "lost": total - written,
+        "errors": [e for _, _, e in per_worker if e],
+    }
+    print(
+        f"{scenario:<18} {entry['ops_per_s']:>10.1f} ops/s  lost {entry['lost']:>4} / {total}"
+        f"  errors {len(entry['errors'])}"
+    )
+    return entry
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="souly 동시 쓰기 벤치마크")
+    parser.add_argument("--size", type=int, default=2000, help="미리 만들어 둘 유저 수")
+    parser.add_argument("--workers", type=int, default=4, help="동시에 쓰는 프로세스 수")
+    parser.add_argument("--ops", type=int, default=50, help="프로세스마다 쓰는 횟수")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="bench_concurrency.json")
+    args = parser.parse_args()
+
+    results = [
+        run_scenario(name, args.size, args.workers, args.ops, args.seed)
+        for name in args.scenarios.split(",") if name
+    ]
+    report = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "environment": {
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "storage": main.STORAGE_BACKEND,
+            "parquet": main.PARQUET_ENABLED,
+            "cpus": os.cpu_count(),
+        },
+        "results": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"결과 저장: {os.path.abspath(args.output)}")
+
+
+if __name__ == "__main__":
+    main_cli()
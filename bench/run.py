@@ -0,0 +1,181 @@
+# ------------------------------
+# 매칭 파이프라인 벤치마크
+#   python -m bench.run --sizes 1000,10000,100000 --output bench_results.json
+# 크기마다 임시 폴더에 가짜 데이터를 만들고 로드 / 점수 계산 / 정렬 / 서로 ♥ / 매너온도
+# 구간의 시간을 재서 JSON 으로 남긴다.
+# ------------------------------
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+import main
+from bench.synth import write_dataset
+
+
+def _timed(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - started)
+    return {"min_s": min(times), "median_s": statistics.median(times), "repeat": repeat}
+
+
+def _record(results, size, name, timing, ops=1, rows=None):
+    entry = {"size": size, "name": name, "ops": ops, **timing}
+    entry["per_op_us"] = timing["median_s"] / ops * 1e6
+    if rows is not None:
+        entry["rows"] = rows
+    results.append(entry)
+    print(f"{size:>8} {name:<28} {entry['per_op_us']:>12.1f} us/op  (ops={ops})")
+
+
+def _load_all():
+    main.load_data()
+    main.load_decisions()
+    main.load_ratings()
+
+
+def _cold_load():
+    main.get_table_cache().invalidate()
+    _load_all()
+
+
+def run_size(size, sample, repeat, seed):
+    results = []
+    counts = write_dataset(size, seed=seed)
+
+    _record(results, size, "load_cold", _timed(_cold_load, repeat), rows=counts)
+    _record(results, size, "load_warm", _timed(_load_all, repeat), rows=counts)
+    _record(results, size, "load_scoring_columns", _timed(main.load_profile_columns, repeat), rows=size)
+
+    df = main.load_data()
+    rng = random.Random(seed)
+    mes = [df.iloc[i] for i in rng.sample(range(len(df)), min(sample, len(df)))]
+    index = main.get_candidate_index()
+    buckets = [df[df["user_id"].isin(index.candidates_for(me))] for me in mes]
+    pairs = sum(len(b) for b in buckets)
+
+    def score_all():
+        for me, others in zip(mes, buckets):
+            main.score_candidates(me, others)
+
+    _record(results, size, "score_vectorized", _timed(score_all, repeat), ops=len(mes), rows=pairs)
+
+    # 비교용: 예전 방식(한 쌍씩 calc_match_score). 너무 오래 걸리지 않게 쌍 수를 자른다.
+    slow_pairs = [(me, row) for me, others in zip(mes, buckets) for _, row in others.head(200).iterrows()]
+
+    def score_rowwise():
+        for me, row in slow_pairs:
+            main.calc_match_score(me, row)
+
+    _record(results, size, "score_calc_match_score", _timed(score_rowwise, 1), ops=max(1, len(slow_pairs)))
+
+    def rank_all():
+        for me in mes:
+            main.top_k_matches(main.iter_match_scores(me, df), 20)
+
+    _record(results, size, "rank_top20", _timed(rank_all, repeat), ops=len(mes))
+
+    # 큰 "전체 공개" 칸이 있으면 근사 검색(SOULY_ANN) 의 recall@20 과 정확한 계산 대비 속도
+    if any(len(bucket["open"]) >= main.ANN_MIN_POOL for bucket in index.buckets.values()):
+        ann = main.ann_recall(sample=sample, k=20, seed=seed)
+        results.append({"size": size, "name": "ann_recall_at20", **ann})
+        print(
+            f"{size:>8} {'ann_recall_at20':<28} {ann['recall']:>12.3f}"
+            f"  (ann {ann['ann_median_s'] * 1e3:.1f} ms / exact {ann['exact_median_s'] * 1e3:.1f} ms,"
+            f" build {ann['build_s']:.1f} s)"
+        )
+
+    decisions = main.load_decisions()
+    ratings = main.load_ratings()
+    _record(results, size, "mutual_build", _timed(lambda: main.MatchGraph(decisions), repeat), rows=len(decisions))
+    graph = main.get_match_graph()
+
+    def mutual_lookup():
+        for me in mes:
+            graph.mutual_matches(me["user_id"])
+            graph.liked_me_only(me["user_id"])
+
+    _record(results, size, "mutual_lookup", _timed(mutual_lookup, repeat), ops=len(mes))
+
+    _record(results, size, "manner_build", _timed(lambda: main.MannerTable(ratings), repeat), rows=len(ratings))
+    manner = main.get_manner_table()
+    user_ids = df["user_id"]
+    _record(
+        results, size, "manner_lookup_all",
+        _timed(lambda: manner.temperatures(user_ids), repeat), ops=len(user_ids),
+    )
+
+    # ♥ 한 번 누르고 다음 화면이 내 선택을 읽을 때까지 (저장소 쓰기는 WriteBehind 가 뒤에서)
+    clicks = [
+        {"timestamp": "", "from_user": me["user_id"], "to_user": other["user_id"], "decision": "수락"}
+        for me, other in zip(mes, reversed(mes))
+    ]
+
+    def click_all():
+        for row in clicks:
+            main.upsert_decision(row)
+            main.get_decision_index().sent_by(row["from_user"])
+
+    # 인덱스를 처음 만드는 비용은 빼고 잰다
+    main.get_decision_index()
+    main.upsert_decision(clicks[0])
+    _record(results, size, "click_decision", _timed(click_all, repeat), ops=len(clicks))
+    main.flush_writes()
+    return results
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="souly 매칭 파이프라인 벤치마크")
+    parser.add_argument("--sizes", default="1000,10000", help="쉼표로 구분한 유저 수 (예: 1000,10000,100000)")
+    parser.add_argument("--sample", type=int, default=50, help="점수/정렬을 잴 유저 수")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="bench_results.json")
+    args = parser.parse_args()
+
+    output = os.path.abspath(args.output)
+    cwd = os.getcwd()
+    results = []
+    for size in [int(s) for s in args.sizes.split(",") if s]:
+        with tempfile.TemporaryDirectory(prefix="souly-bench-") as workdir:
+            # 저장소 파일 경로가 상대 경로라서 크기마다 빈 폴더에서 돌린다
+            os.chdir(workdir)
+            main.get_storage.clear()
+            try:
+                results.extend(run_size(size, args.sample, args.repeat, args.seed))
+            finally:
+                os.chdir(cwd)
+                main.get_storage.clear()
+                main.get_table_cache().invalidate()
+
+    report = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "environment": {
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "numpy": np.__version__,
+            "storage": main.STORAGE_BACKEND,
+            "parquet": main.PARQUET_ENABLED,
+            "write_behind": main.WRITE_BEHIND,
+            "ann": main.ANN_ENABLED,
+            "cpus": os.cpu_count(),
+        },
+        "results": results,
+    }
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"결과 저장: {output}")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,130 @@
+# ------------------------------
+# 벤치마크용 가짜 데이터 생성기
+# register_survey 와 같은 보기 / 같은 컬럼으로 프로필·결정·별점을 만든다.
+# ------------------------------
+import random
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+import main
+
+BASE_TIME = datetime(2026, 1, 1)
+
+
+def _sample_tags(rng, options, lo, hi):
+    return ";".join(rng.sample(options, rng.randint(lo, hi)))
+
+
+def _profile(rng, i, purpose, match_mode, group_size, group_scope, group_name, team_code):
+    age = rng.randint(15, 30)
+    gender = rng.choices(main.GENDER_OPTIONS, weights=[10, 10, 1])[0]
+    height = int(rng.gauss(172 if gender == "남성" else 161, 6))
+    min_age = max(10, age - rng.randint(0, 4))
+    max_age = min(100, age + rng.randint(0, 5))
+    min_height = rng.randint(140, 170)
+    return {
+        "timestamp": (BASE_TIME + timedelta(seconds=i)).isoformat(),
+        "user_id": f"user{i}",
+        "purpose": purpose,
+        "match_mode": match_mode,
+        "group_size": group_size,
+        "group_scope": group_scope,
+        "group_name": group_name,
+        "self_age": age,
+        "self_gender": gender,
+        "self_personality": _sample_tags(rng, main.PERSONALITY_OPTIONS, 1, 3),
+        "self_appearance": rng.choice(main.APPEARANCE_OPTIONS),
+        "self_body_type": rng.choices(main.BODY_TYPE_OPTIONS, weights=[2, 6, 2])[0],
+        "self_mbti": rng.choice(["", "INFP", "ENFP", "ISTJ", "ESTJ", "INTJ", "ENTP"]),
+        "self_height": min(220, max(130, height)),
+        "pref_min_age": min_age,
+        "pref_max_age": max_age,
+        "pref_gender": rng.choices(main.PREF_GENDER_OPTIONS, weights=[4, 3, 3])[0],
+        "pref_personality": _sample_tags(rng, main.PERSONALITY_OPTIONS, 0, 3),
+        "pref_appearance": _sample_tags(rng, ["상관없음"] + main.APPEARANCE_OPTIONS, 0, 2),
+        "pref_body_type": _sample_tags(rng, ["상관없음"] + main.BODY_TYPE_OPTIONS, 0, 2),
+        "pref_min_height": min_height,
+        "pref_max_height": min(220, min_height + rng.randint(10, 40)),
+        "blacklist_personality": _sample_tags(rng, main.PERSONALITY_OPTIONS, 0, 1),
+        "blacklist_appearance": _sample_tags(rng, main.APPEARANCE_OPTIONS, 0, 1),
+        "contact_info": rng.choice(["", f"@user{i}"]),
+        "team_code": team_code,
+    }
+
+
+def generate_profiles(n, seed=0, n_groups=None):
+    # 팀 매칭은 같은 팀 코드를 가진 사람을 group_size 명씩 한꺼번에 만든다
+    rng = random.Random(seed)
+    groups = [f"학교{g}" for g in range(n_groups or max(1, n // 200))]
+    rows = []
+    while len(rows) < n:
+        purpose = rng.choices(main.PURPOSE_OPTIONS, weights=[5, 4, 2, 2, 1])[0]
+        match_mode = rng.choices(main.MATCH_MODE_OPTIONS, weights=[6, 2, 2])[0]
+        group_scope = rng.choices(main.GROUP_SCOPE_OPTIONS, weights=[3, 1])[0]
+        group_name = rng.choice(groups) if group_scope == "특정 그룹 내에서" else ""
+        team_code = ""
+        members = 1
+        if match_mode == "1:1 매칭":
+            group_size = 2
+        elif match_mode == "다인원 매칭":
+            group_size = rng.choice([3, 4, 5])
+        else:
+            group_size = rng.choice([2, 3, 4, 5])
+            members = min(group_size, n - len(rows))
+            team_code = f"team{len(rows)}"
+        for _ in range(members):
+            rows.append(
+                _profile(rng, len(rows), purpose, match_mode, group_size, group_scope, group_name, team_code)
+            )
+    return pd.DataFrame(rows, columns=main.PROFILE_COLUMNS)
+
+
+def generate_decisions(profiles, per_user=10, accept_rate=0.5, reciprocity=0.3, seed=0):
+    # 같은 목적/매칭 방식 안에서 상대를 골라 ♥/패스. 일부는 상대도 ♥ 로 답한다.
+    rng = random.Random(seed)
+    rows = []
+    for _, part in profiles.groupby(["purpose", "match_mode"]):
+        ids = part["user_id"].tolist()
+        if len(ids) < 2:
+            continue
+        for user_id in ids:
+            for partner_id in rng.sample(ids, min(per_user, len(ids))):
+                if partner_id == user_id:
+                    continue
+                accepted = rng.random() < accept_rate
+                rows.append((user_id, partner_id, "수락" if accepted else "거절"))
+                if accepted and rng.random() < reciprocity:
+                    rows.append((partner_id, user_id, "수락"))
+    df = pd.DataFrame(rows, columns=["from_user", "to_user", "decision"])
+    df = df.drop_duplicates(["from_user", "to_user"], keep="last").reset_index(drop=True)
+    df.insert(0, "timestamp", [(BASE_TIME + timedelta(seconds=i)).isoformat() for i in range(len(df))])
+    return df[main.DECISION_COLUMNS]
+
+
+def generate_ratings(decisions, rate_prob=0.7, seed=0):
+    # 서로 ♥ 한 쌍만 별점을 남긴다
+    rng = random.Random(seed)
+    accepts = decisions[decisions["decision"] == "수락"]
+    edges = set(zip(accepts["from_user"], accepts["to_user"]))
+    rows = [
+        (a, b, rng.choices(range(1, 11), weights=[1, 1, 1, 1, 2, 3, 4, 5, 5, 4])[0])
+        for a, b in edges
+        if (b, a) in edges and rng.random() < rate_prob
+    ]
+    df = pd.DataFrame(rows, columns=["from_user", "to_user", "rating"])
+    df.insert(0, "timestamp", [(BASE_TIME + timedelta(seconds=i)).isoformat() for i in range(len(df))])
+    return df[main.RATING_COLUMNS]
+
+
+def write_dataset(n, seed=0):
+    # 현재 저장소(get_storage)에 세 표를 새로 쓴다
+    profiles = generate_profiles(n, seed=seed)
+    decisions = generate_decisions(profiles, seed=seed)
+    ratings = generate_ratings(decisions, seed=seed)
+    storage = main.get_storage()
+    storage.save("profiles", profiles)
+    storage.save("decisions", decisions)
+    storage.save("ratings", ratings)
+    main.get_table_cache().invalidate()
+    return {"profiles": len(profiles), "decisions": len(decisions), "ratings": len(ratings)}
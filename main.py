@@ -1,68 +1,1192 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
+import atexit
+import csv
+import functools
+import heapq
+import hmac
+import io
+import json
+import logging
 import os
+import random
+import shutil
+import sqlite3
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime
 
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow 가 없으면 CSV 만 쓴다
+    pa = None
+    pq = None
+
+try:
+    import fcntl
+except ImportError:  # Windows 등: 프로세스 사이 잠금 없이 스레드 잠금만
+    fcntl = None
+
+# 캐시된 표를 얕은 복사본으로 나눠 주기 때문에 Copy-on-Write 가 켜져 있어야 한다 (pandas 3 부터는 항상 켜짐)
+if int(pd.__version__.split(".")[0]) == 2:
+    pd.set_option("mode.copy_on_write", True)
+
 # ------------------------------
 # 파일 이름 설정
 # ------------------------------
 DATA_FILE = "responses.csv"
 DECISIONS_FILE = "decisions.csv"
 RATINGS_FILE = "ratings.csv"
+MATCH_TOPK_FILE = "match_topk.csv"
+GROUPS_FILE = "group_assignments.csv"
+DAILY_PICKS_FILE = "daily_picks.csv"
+
+# 저장소 선택: "csv" (기본) 또는 "sqlite"
+STORAGE_BACKEND = os.environ.get("SOULY_STORAGE", "csv")
+DB_FILE = os.environ.get("SOULY_DB_FILE", "souly.db")
+
+PROFILE_COLUMNS = [
+    "timestamp", "user_id", "purpose",
+    "match_mode", "group_size",
+    "group_scope", "group_name",
+    "self_age", "self_gender",
+    "self_personality", "self_appearance",
+    "self_body_type", "self_mbti",
+    "self_height",
+    "pref_min_age", "pref_max_age",
+    "pref_gender", "pref_personality",
+    "pref_appearance", "pref_body_type",
+    "pref_min_height", "pref_max_height",
+    "blacklist_personality", "blacklist_appearance",
+    "contact_info",
+    "team_code",
+]
+DECISION_COLUMNS = ["timestamp", "from_user", "to_user", "decision"]
+RATING_COLUMNS = ["timestamp", "from_user", "to_user", "rating"]
+MATCH_TOPK_COLUMNS = ["user_id", "rank", "candidate_id", "score", "computed_at"]
+GROUP_COLUMNS = ["user_id", "group_id", "score", "computed_at"]
+DAILY_PICK_COLUMNS = ["user_id", "partner_id", "score", "computed_at"]
+
+# 테이블 이름 → (CSV 파일, 컬럼, 기본 키)
+TABLES = {
+    "profiles": (DATA_FILE, PROFILE_COLUMNS, ("user_id",)),
+    "decisions": (DECISIONS_FILE, DECISION_COLUMNS, ("from_user", "to_user")),
+    "ratings": (RATINGS_FILE, RATING_COLUMNS, ("from_user", "to_user")),
+    "match_topk": (MATCH_TOPK_FILE, MATCH_TOPK_COLUMNS, ("user_id", "candidate_id")),
+    "groups": (GROUPS_FILE, GROUP_COLUMNS, ("user_id",)),
+    "daily_picks": (DAILY_PICKS_FILE, DAILY_PICK_COLUMNS, ("user_id",)),
+}
+
+PURPOSE_OPTIONS = ["친구", "연애", "스터디", "취미", "기타"]
+MATCH_MODE_OPTIONS = ["1:1 매칭", "다인원 매칭", "팀 매칭 (친구와 함께)"]
+GROUP_SCOPE_OPTIONS = ["전체 공개", "특정 그룹 내에서"]
+GENDER_OPTIONS = ["여성", "남성", "기타"]
+PREF_GENDER_OPTIONS = ["상관없음", "여성", "남성"]
+PERSONALITY_OPTIONS = [
+    "내향적", "외향적", "차분함", "활발함", "유머있음",
+    "논리적", "감성적", "리더형", "서포터형", "즉흥적", "계획적",
+]
+APPEARANCE_OPTIONS = ["강아지상", "고양이상", "여우상", "토끼상", "곰상", "사슴상", "공룡상", "기타"]
+BODY_TYPE_OPTIONS = ["저체중", "보통", "과체중"]
+
+# 이벤트 로그로 쌓는 표와, 로그를 스냅샷에 접는 크기
+LOG_TABLES = ("decisions", "ratings")
+# 사람마다 목록을 통째로 바꾸는 표. 바꾼 목록(rank 0 줄부터)만 로그에 덧붙이고, 읽을 때 사람마다 마지막 목록을 쓴다.
+LIST_LOG_TABLES = ("match_topk",)
+LOG_COMPACT_BYTES = int(os.environ.get("SOULY_LOG_COMPACT_BYTES", 1 << 20))
+
+# ♥/패스, 별점은 캐시에 바로 반영하고 저장소에는 뒤에서 모아서 쓴다 (N 건마다 또는 T ms 마다)
+WRITE_BEHIND = os.environ.get("SOULY_WRITE_BEHIND", "1") != "0"
+WRITE_BEHIND_BATCH = int(os.environ.get("SOULY_WRITE_BEHIND_BATCH", 64))
+WRITE_BEHIND_MS = int(os.environ.get("SOULY_WRITE_BEHIND_MS", 200))
+
+# 읽은 뒤 다른 세션이 먼저 써서 버전이 바뀌었을 때 잠금 없이 다시 해 보는 횟수 (그다음엔 표 잠금을 잡고)
+WRITE_RETRIES = int(os.environ.get("SOULY_WRITE_RETRIES", 3))
+
+INTEGER_COLUMNS = {
+    "group_size", "self_age", "self_height",
+    "pref_min_age", "pref_max_age", "pref_min_height", "pref_max_height",
+    "rating", "rank",
+}
+REAL_COLUMNS = {"score"}
+
+# 프로필 표의 Parquet 스냅샷 (pyarrow 가 있을 때만, SOULY_PARQUET=0 이면 끔)
+PROFILE_SNAPSHOT_FILE = os.path.splitext(DATA_FILE)[0] + ".parquet"
+PARQUET_ENABLED = pq is not None and os.environ.get("SOULY_PARQUET", "1") != "0"
+PROFILE_INT_COLUMNS = [
+    "group_size", "self_age", "self_height",
+    "pref_min_age", "pref_max_age", "pref_min_height", "pref_max_height",
+]
+PROFILE_CATEGORY_COLUMNS = [
+    "purpose", "match_mode", "group_scope",
+    "self_gender", "pref_gender", "self_appearance", "self_body_type",
+]
+# 점수 계산(add_score_columns + score_pairs)에 필요한 컬럼만
+SCORING_COLUMNS = [
+    "user_id", "purpose", "match_mode", "group_size", "group_scope", "group_name",
+    "self_age", "self_gender", "self_personality", "self_appearance", "self_body_type", "self_height",
+    "pref_min_age", "pref_max_age", "pref_gender", "pref_personality",
+    "pref_appearance", "pref_body_type", "pref_min_height", "pref_max_height",
+    "blacklist_personality", "blacklist_appearance", "team_code",
+]
+
+
+def _sql_type(col):
+    if col in INTEGER_COLUMNS:
+        return "INTEGER"
+    if col in REAL_COLUMNS:
+        return "REAL"
+    return "TEXT"
+
+
+# ------------------------------
+# 성능 측정 (SOULY_METRICS=1 일 때만)
+# ------------------------------
+METRICS_ENABLED = os.environ.get("SOULY_METRICS", "") == "1"
+METRICS_FILE = os.environ.get("SOULY_METRICS_FILE", "metrics.prom")
+# 관리자 페이지 비밀 토큰 (st.secrets 의 admin_token 도 된다). 없으면 관리자 탭을 띄우지 않는다
+ADMIN_TOKEN = os.environ.get("SOULY_ADMIN_TOKEN", "")
+METRICS_WINDOW = 2048
+
+
+class MetricsRegistry:
+    # 구간별 호출 수 / 최근 METRICS_WINDOW 번의 소요 시간 / 처리한 행 수
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = {}
+        self.total = {}
+        self.rows = {}
+        self.samples = {}
+
+    def record(self, name, seconds, rows=None):
+        with self.lock:
+            self.calls[name] = self.calls.get(name, 0) + 1
+            self.total[name] = self.total.get(name, 0.0) + seconds
+            self.samples.setdefault(name, deque(maxlen=METRICS_WINDOW)).append(seconds)
+            if rows is not None:
+                self.rows[name] = self.rows.get(name, 0) + rows
+
+    def snapshot(self):
+        with self.lock:
+            names = sorted(self.calls)
+            samples = {name: np.array(self.samples[name]) for name in names}
+            out = []
+            for name in names:
+                p50, p95, p99 = np.percentile(samples[name], [50, 95, 99]) * 1000
+                out.append({
+                    "name": name,
+                    "calls": self.calls[name],
+                    "p50_ms": round(p50, 3),
+                    "p95_ms": round(p95, 3),
+                    "p99_ms": round(p99, 3),
+                    "total_s": round(self.total[name], 6),
+                    "rows": self.rows.get(name, 0),
+                })
+            return out
+
+    def to_prometheus(self):
+        lines = [
+            "# HELP souly_call_duration_seconds Latency of instrumented souly code paths.",
+            "# TYPE souly_call_duration_seconds summary",
+        ]
+        snapshot = self.snapshot()
+        for item in snapshot:
+            label = f'name="{item["name"]}"'
+            for q, key in (("0.5", "p50_ms"), ("0.95", "p95_ms"), ("0.99", "p99_ms")):
+                lines.append(f'souly_call_duration_seconds{{{label},quantile="{q}"}} {item[key] / 1000:.6f}')
+            lines.append(f"souly_call_duration_seconds_sum{{{label}}} {item['total_s']}")
+            lines.append(f"souly_call_duration_seconds_count{{{label}}} {item['calls']}")
+        lines.append("# HELP souly_rows_processed_total Rows processed by instrumented code paths.")
+        lines.append("# TYPE souly_rows_processed_total counter")
+        for item in snapshot:
+            lines.append(f'souly_rows_processed_total{{name="{item["name"]}"}} {item["rows"]}')
+        return "\n".join(lines) + "\n"
+
+
+@st.cache_resource
+def get_metrics():
+    return MetricsRegistry()
+
+
+def timed(name, rows=None):
+    # 함수 소요 시간을 기록하는 데코레이터. 꺼져 있으면 원래 함수를 그대로 돌려준다.
+    # rows: 결과에서 처리한 행 수를 꺼내는 함수 (선택)
+    def deco(fn):
+        if not METRICS_ENABLED:
+            return fn
+        registry = get_metrics()
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            result = fn(*args, **kwargs)
+            registry.record(name, time.perf_counter() - started, rows(result) if rows else None)
+            return result
+
+        return wrapper
+
+    return deco
+
+
+class _BlockTimer:
+    def __init__(self):
+        self.rows = None
+
+    def count(self, items):
+        # 제너레이터를 감싸서 흘러간 개수를 rows 로 센다
+        self.rows = 0
+        for item in items:
+            self.rows += 1
+            yield item
+
+
+class _NoopTimer:
+    rows = None
+
+    def count(self, items):
+        return items
+
+
+@contextmanager
+def timed_block(name):
+    # 함수 하나로 떼기 애매한 페이지 안 구간용
+    if not METRICS_ENABLED:
+        yield _NoopTimer()
+        return
+    timer = _BlockTimer()
+    started = time.perf_counter()
+    try:
+        yield timer
+    finally:
+        get_metrics().record(name, time.perf_counter() - started, timer.rows)
+
+
+def export_prometheus(path=METRICS_FILE):
+    text = get_metrics().to_prometheus()
+    stats = cache_stats()
+    text += "# TYPE souly_table_cache_hits_total counter\n"
+    text += f"souly_table_cache_hits_total {stats['hits']}\n"
+    text += "# TYPE souly_table_cache_misses_total counter\n"
+    text += f"souly_table_cache_misses_total {stats['misses']}\n"
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+    return text
+
+
+# ------------------------------
+# 저장소 (CSV / SQLite)
+# ------------------------------
+def _file_stamp(path):
+    try:
+        st_ = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st_.st_mtime_ns, st_.st_size)
+
+
+class StaleWriteError(RuntimeError):
+    # 읽은 버전(stamp)과 저장 직전 버전이 다르다 = 그 사이 다른 세션이 먼저 썼다
+    pass
+
+
+class TableLock:
+    # 표 하나의 쓰기 잠금. 같은 프로세스 안은 RLock, 프로세스끼리는 <표>.lock 파일에 fcntl.flock.
+    # 같은 스레드가 다시 잡아도 된다 (upsert 안에서 compact 등).
+    def __init__(self, path):
+        self.path = path
+        self.rlock = threading.RLock()
+        self.depth = 0
+        self.fd = None
+
+    def __enter__(self):
+        self.rlock.acquire()
+        if self.depth == 0 and fcntl is not None:
+            try:
+                if self.fd is None:
+                    self.fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+                fcntl.flock(self.fd, fcntl.LOCK_EX)
+            except BaseException:
+                self.rlock.release()
+                raise
+        self.depth += 1
+        return self
+
+    def __exit__(self, *exc):
+        self.depth -= 1
+        if self.depth == 0 and self.fd is not None:
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+        self.rlock.release()
+
+
+def _profile_arrow_table(df):
+    # 나이/키는 정수, 목적/매칭 방식/성별/외모 등은 사전 인코딩(카테고리)으로 고정한 스키마
+    arrays = []
+    for col in df.columns:
+        values = df[col]
+        if col in PROFILE_INT_COLUMNS:
+            values = pd.to_numeric(values, errors="coerce")
+            whole = values.dropna()
+            kind = pa.int32() if (whole == whole.round()).all() else pa.float64()
+            arrays.append(pa.array(values, type=kind, from_pandas=True))
+            continue
+        arr = pa.array(values.to_numpy(dtype=object), from_pandas=True)
+        if col in PROFILE_CATEGORY_COLUMNS and pa.types.is_string(arr.type):
+            arr = arr.dictionary_encode()
+        arrays.append(arr)
+    return pa.Table.from_arrays(arrays, names=[str(c) for c in df.columns])
+
+
+def _read_profile_snapshot(path, columns=None):
+    table = pq.read_table(path, columns=columns, memory_map=True)
+    df = table.to_pandas()
+    # read_csv 와 똑같이 빈 값(None, 빈 문자열)은 NaN
+    return df.where(df.notna(), np.nan).replace("", np.nan)
+
+
+class CsvStorage:
+    # 테이블마다 CSV 파일 하나.
+    # 프로필은 쓸 때마다 파일 전체를 다시 쓰고, 결정/별점은 이벤트 로그에 한 줄씩 덧붙인다.
+    #   decisions.csv        : 스냅샷
+    #   decisions.log        : 스냅샷 이후 이벤트 (한 줄 append + fsync)
+    #   decisions.audit.log  : 스냅샷에 접힌 이벤트 전체 (감사 기록)
+    # 읽을 때 스냅샷 + 로그를 (from_user, to_user) 기준 마지막 값으로 합친다.
+    # match_topk 도 고친 사람 목록만 match_topk.log 에 덧붙인다 (스냅샷은 배치 / 로그 접기 때만 다시 쓴다).
+    # 프로필은 같은 저장 경로에서 responses.parquet 스냅샷도 같이 쓰고, 있으면 그쪽을 읽는다.
+    # 쓰기는 표마다 TableLock 을 잡고 하고, 파일은 임시 파일 + os.replace 로 바꿔서
+    # 읽는 쪽은 잠금 없이 항상 온전한 파일을 본다.
+    def __init__(self, files=None, snapshot=None):
+        self.files = files or {name: spec[0] for name, spec in TABLES.items()}
+        self.snapshot = snapshot or (PROFILE_SNAPSHOT_FILE if PARQUET_ENABLED else None)
+        self.locks = {table: TableLock(self._log_path(table, ".lock")) for table in self.files}
+
+    def _log_path(self, table, suffix=".log"):
+        return os.path.splitext(self.files[table])[0] + suffix
+
+    def _logged(self, table):
+        return table in LOG_TABLES or table in LIST_LOG_TABLES
+
+    def _log_paths(self, table):
+        # 접는 중인 로그가 먼저, 새 로그가 나중 (오래된 것 → 새것 순서)
+        return [self._log_path(table, ".log.compacting"), self._log_path(table)]
+
+    def _snapshot_fresh(self, table):
+        # CSV 보다 먼저 쓰인(= 낡은) 스냅샷은 무시한다. CSV 를 손으로 고친 경우 등.
+        if table != "profiles" or not self.snapshot:
+            return False
+        snap = _file_stamp(self.snapshot)
+        csv_stamp = _file_stamp(self.files[table])
+        return snap is not None and (csv_stamp is None or snap[0] >= csv_stamp[0])
+
+    def _write_profile_snapshot(self, df):
+        if not self.snapshot:
+            return
+        tmp = self.snapshot + ".tmp"
+        try:
+            pq.write_table(_profile_arrow_table(df), tmp)
+        except (pa.ArrowException, TypeError, ValueError):
+            # 타입이 섞여 스키마에 못 맞추면 스냅샷 없이 CSV 만 쓴다
+            for p in (tmp, self.snapshot):
+                if os.path.exists(p):
+                    os.remove(p)
+            return
+        os.replace(tmp, self.snapshot)
+
+    def load(self, table):
+        path = self.files[table]
+        _, columns, keys = TABLES[table]
+        if self._snapshot_fresh(table):
+            return _read_profile_snapshot(self.snapshot)
+        if os.path.exists(path):
+            df = pd.read_csv(path)
+        else:
+            df = pd.DataFrame(columns=columns)
+        if not self._logged(table):
+            return df
+        logs = [df]
+        for log_path in self._log_paths(table):
+            if os.path.exists(log_path) and os.path.getsize(log_path) > 0:
+                log = _read_log(log_path, columns)
+                logs.append(_valid_events(table, log.dropna(subset=list(keys) + [columns[-1]])))
+        if len(logs) == 1:
+            return df
+        if table in LIST_LOG_TABLES:
+            return _replay_lists(df, pd.concat(logs[1:], ignore_index=True))
+        merged = pd.concat(logs, ignore_index=True)
+        return merged.drop_duplicates(list(keys), keep="last").reset_index(drop=True)
+
+    def load_columns(self, table, columns):
+        # 필요한 컬럼만 읽기. 스냅샷이 있으면 그 컬럼만 메모리 매핑으로 읽는다.
+        if self._snapshot_fresh(table):
+            present = set(pq.read_schema(self.snapshot).names)
+            return _read_profile_snapshot(self.snapshot, [c for c in columns if c in present])
+        path = self.files[table]
+        if self._logged(table) or not os.path.exists(path):
+            df = self.load(table)
+            return df[[c for c in columns if c in df.columns]]
+        return pd.read_csv(path, usecols=lambda c: c in columns)
+
+    def _write_snapshot(self, table, df):
+        path = self.files[table]
+        tmp = path + ".tmp"
+        df.to_csv(tmp, index=False)
+        os.replace(tmp, path)
+
+    def _archive_logs(self, table, paths):
+        # 결정/별점 로그는 감사 기록으로 옮기고, 목록 로그는 스냅샷에 접혔으니 그냥 지운다
+        if table in LOG_TABLES:
+            with open(self._log_path(table, ".audit.log"), "a", encoding="utf-8") as audit:
+                for log_path in paths:
+                    if os.path.exists(log_path):
+                        with open(log_path, encoding="utf-8") as log:
+                            shutil.copyfileobj(log, audit)
+        for log_path in paths:
+            if os.path.exists(log_path):
+                os.remove(log_path)
+
+    def write_lock(self, table):
+        return self.locks[table]
+
+    def _check(self, table, expected):
+        if expected is not None and self.stamp(table) != expected:
+            raise StaleWriteError(table)
+
+    def save(self, table, df, expected=None):
+        # expected 가 있으면 그 버전일 때만 쓴다. 반환값은 쓴 직후의 stamp.
+        with self.locks[table]:
+            self._check(table, expected)
+            self._write_snapshot(table, df)
+            if table == "profiles":
+                self._write_profile_snapshot(df)
+            if self._logged(table):
+                self._archive_logs(table, self._log_paths(table))
+            return self.stamp(table)
+
+    def stamp(self, table):
+        # 파일 수정 시각 + 크기. 둘 중 하나라도 바뀌면 다시 읽는다.
+        stamp = _file_stamp(self.files[table])
+        if self._logged(table):
+            stamp = (stamp,) + tuple(_file_stamp(p) for p in self._log_paths(table))
+        return stamp
+
+    def upsert(self, table, row):
+        return self.upsert_many(table, [row])
+
+    def upsert_many(self, table, rows):
+        # 반환값: (쓰기 직전 stamp, 쓴 직후 stamp). 잠금 안에서 재므로 그 사이 다른 쓰기는 없다.
+        keys = list(TABLES[table][2])
+        with self.locks[table]:
+            before = self.stamp(table)
+            if table in LOG_TABLES:
+                self.append_events(table, rows)
+                return before, self.stamp(table)
+            df = self.load(table)
+            new = pd.DataFrame(rows).drop_duplicates(keys, keep="last")
+            same = df.set_index(keys).index.isin(new.set_index(keys).index)
+            df = pd.concat([df[~same], new], ignore_index=True)
+            return before, self.save(table, df)
+
+    def patch(self, table, deletes, rows, expected=None):
+        # deletes = {컬럼: 값 목록} 중 하나라도 맞는 줄을 지우고 rows 를 덧붙인다
+        with self.locks[table]:
+            self._check(table, expected)
+            before = self.stamp(table)
+            if table in LIST_LOG_TABLES and _whole_lists(deletes, rows):
+                self.append_events(table, rows)
+                return before, self.stamp(table)
+            df = self.load(table)
+            df = pd.concat([df[~_match_any(df, deletes)], pd.DataFrame(rows, columns=TABLES[table][1])], ignore_index=True)
+            return before, self.save(table, df)
+
+    def append_event(self, table, row):
+        self.append_events(table, [row])
+
+    def append_events(self, table, rows):
+        # 여러 줄을 한 번에 덧붙이고 fsync 는 한 번만
+        columns = TABLES[table][1]
+        lines = io.StringIO()
+        writer = csv.writer(lines)
+        for row in rows:
+            writer.writerow([_sql_value(row.get(c)) for c in columns])
+        log_path = self._log_path(table)
+        with self.locks[table]:
+            _trim_torn_tail(log_path)
+            with open(log_path, "a", encoding="utf-8", newline="") as f:
+                f.write(lines.getvalue())
+                f.flush()
+                os.fsync(f.fileno())
+            if os.path.getsize(log_path) >= LOG_COMPACT_BYTES:
+                self.compact(table)
+
+    def compact(self, table):
+        # 로그를 .compacting 으로 떼어 낸 뒤 스냅샷에 접는다. 그 사이 새 이벤트는 새 로그로 간다.
+        if not self._logged(table):
+            return
+        with self.locks[table]:
+            log_path = self._log_path(table)
+            pending = self._log_path(table, ".log.compacting")
+            if not os.path.exists(pending):
+                if not os.path.exists(log_path):
+                    return
+                os.replace(log_path, pending)
+            self._write_snapshot(table, self.load(table))
+            self._archive_logs(table, [pending])
+
+
+def _read_log(path, columns):
+    # 줄바꿈으로 끝나지 않은 마지막 줄은 쓰다 끊긴 줄이라 버린다 ("10" 이 "1" 로 잘린 경우 등)
+    with open(path, "rb") as f:
+        data = f.read()
+    data = data[:data.rfind(b"\n") + 1]
+    if not data:
+        return pd.DataFrame(columns=columns)
+    return pd.read_csv(io.BytesIO(data), header=None, names=columns, on_bad_lines="skip")
+
+
+def _trim_torn_tail(path):
+    # 줄바꿈 없이 끊긴 마지막 줄을 잘라 낸다. 그대로 두면 다음 줄이 그 뒤에 이어 붙어 함께 버려진다
+    try:
+        f = open(path, "rb+")
+    except FileNotFoundError:
+        return
+    with f:
+        end = f.seek(0, os.SEEK_END)
+        if end == 0:
+            return
+        f.seek(end - 1)
+        if f.read(1) == b"\n":
+            return
+        pos = end
+        while pos > 0:
+            step = min(4096, pos)
+            f.seek(pos - step)
+            i = f.read(step).rfind(b"\n")
+            if i >= 0:
+                f.truncate(pos - step + i + 1)
+                return
+            pos -= step
+        f.truncate(0)
+
+
+def _valid_events(table, log):
+    # 다시 읽은 결정/별점이 화면에서 쓸 수 있는 값인지 (망가진 줄은 버린다)
+    if table == "decisions":
+        return log[log["decision"].isin(DECISION_OPTIONS)]
+    if table == "ratings":
+        rating = pd.to_numeric(log["rating"], errors="coerce")
+        return log[rating.between(1, 10) & (rating % 1 == 0)]
+    return log
+
+
+def _whole_lists(deletes, rows):
+    # user_id 로만 지우고, 지우는 사람마다 새 목록(rank 0 줄로 시작)이 rows 에 이어져 있으면 True
+    if set(deletes) != {"user_id"}:
+        return False
+    starts = []
+    for i, row in enumerate(rows):
+        new_run = i == 0 or rows[i - 1]["user_id"] != row["user_id"]
+        if new_run != (row["rank"] == 0):
+            return False
+        if new_run:
+            starts.append(row["user_id"])
+    return len(starts) == len(set(starts)) and set(starts) == set(deletes["user_id"])
+
+
+def _replay_lists(snapshot, log):
+    # 로그에서는 rank 0 줄마다 새 목록이 시작된다. user_id 마다 마지막 목록만 남기고 스냅샷의 옛 목록은 버린다.
+    block = (log["rank"] == 0).cumsum()
+    log = log[(block > 0) & (block == block.groupby(log["user_id"]).transform("max"))]
+    snapshot = snapshot[~snapshot["user_id"].isin(log["user_id"])]
+    return pd.concat([snapshot, log], ignore_index=True)
+
+
+def _match_any(df, deletes):
+    hit = pd.Series(False, index=df.index)
+    for col, values in deletes.items():
+        hit |= df[col].isin(list(values))
+    return hit
+
+
+def compact_logs():
+    storage = get_storage()
+    if hasattr(storage, "compact"):
+        for table in LOG_TABLES + LIST_LOG_TABLES:
+            storage.compact(table)
+
+
+def _sql_value(val):
+    if val is None:
+        return None
+    if isinstance(val, np.generic):
+        val = val.item()
+    try:
+        if pd.isna(val):
+            return None
+    except (TypeError, ValueError):
+        pass
+    return val
+
+
+class SqliteStorage:
+    # 한 DB 파일에 세 테이블. WAL 모드 + 한 줄씩 UPSERT.
+    # 쓰기는 BEGIN IMMEDIATE 로 DB 전체가 직렬화되고, 표마다 TableLock 도 잡는다 (update_table 용).
+    def __init__(self, path=DB_FILE):
+        self.path = path
+        self.lock = threading.Lock()
+        self.locks = {table: TableLock(f"{path}.{table}.lock") for table in TABLES}
+        self.writes = {table: 0 for table in TABLES}
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        for table, (_, columns, keys) in TABLES.items():
+            col_defs = ", ".join(
+                f'"{c}" {_sql_type(c)}' for c in columns
+            )
+            key_def = ", ".join(keys)
+            self.conn.execute(f"CREATE TABLE IF NOT EXISTS {table} ({col_defs}, PRIMARY KEY ({key_def}))")
+
+    def _stamp(self, table):
+        data_version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+        return (data_version, self.writes[table])
+
+    def stamp(self, table):
+        # data_version 은 다른 연결(다른 프로세스)이 커밋하면 바뀌고, 내 쓰기는 writes 로 센다
+        with self.lock:
+            return self._stamp(table)
+
+    def write_lock(self, table):
+        return self.locks[table]
+
+    @contextmanager
+    def _write(self, table, expected=None):
+        # BEGIN IMMEDIATE 로 DB 쓰기 잠금을 잡은 채 실행하고, 넘겨준 목록에 (직전 stamp, 직후 stamp) 를 채운다.
+        # 다른 프로세스가 잡고 있으면 connect(timeout=...) 만큼 기다린다.
+        stamps = []
+        with self.locks[table], self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                stamps.append(self._stamp(table))
+                if expected is not None and stamps[0] != expected:
+                    raise StaleWriteError(table)
+                yield stamps
+                self.conn.execute("COMMIT")
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+            self.writes[table] += 1
+            stamps.append(self._stamp(table))
+
+    def load(self, table):
+        columns = TABLES[table][1]
+        col_sql = ", ".join(f'"{c}"' for c in columns)
+        with self.lock:
+            df = pd.read_sql_query(f"SELECT {col_sql} FROM {table} ORDER BY rowid", self.conn)
+        # read_csv 와 똑같이 빈 값은 NaN 으로 맞춘다
+        df = df.replace("", np.nan)
+        return df.where(df.notna(), np.nan).infer_objects()
+
+    def load_columns(self, table, columns):
+        col_sql = ", ".join(f'"{c}"' for c in TABLES[table][1] if c in columns)
+        with self.lock:
+            df = pd.read_sql_query(f"SELECT {col_sql} FROM {table} ORDER BY rowid", self.conn)
+        df = df.replace("", np.nan)
+        return df.where(df.notna(), np.nan).infer_objects()
+
+    def save(self, table, df, expected=None):
+        columns = TABLES[table][1]
+        rows = [
+            tuple(_sql_value(r.get(c)) for c in columns)
+            for r in df.to_dict("records")
+        ]
+        col_sql = ", ".join(f'"{c}"' for c in columns)
+        marks = ", ".join("?" for _ in columns)
+        with self._write(table, expected) as stamps:
+            self.conn.execute(f"DELETE FROM {table}")
+            self.conn.executemany(f"INSERT INTO {table} ({col_sql}) VALUES ({marks})", rows)
+        return stamps[1]
+
+    def upsert(self, table, row):
+        return self.upsert_many(table, [row])
+
+    def patch(self, table, deletes, rows, expected=None):
+        columns = TABLES[table][1]
+        col_sql = ", ".join(f'"{c}"' for c in columns)
+        marks = ", ".join("?" for _ in columns)
+        values = [tuple(_sql_value(r.get(c)) for c in columns) for r in rows]
+        with self._write(table, expected) as stamps:
+            for col, keys in deletes.items():
+                keys = [_sql_value(k) for k in keys]
+                for i in range(0, len(keys), 500):
+                    chunk = keys[i:i + 500]
+                    self.conn.execute(
+                        f'DELETE FROM {table} WHERE "{col}" IN ({", ".join("?" for _ in chunk)})', chunk
+                    )
+            self.conn.executemany(f"INSERT INTO {table} ({col_sql}) VALUES ({marks})", values)
+        return tuple(stamps)
+
+    def upsert_many(self, table, rows):
+        _, columns, keys = TABLES[table]
+        col_sql = ", ".join(f'"{c}"' for c in columns)
+        marks = ", ".join("?" for _ in columns)
+        updates = ", ".join(f'"{c}" = excluded."{c}"' for c in columns if c not in keys)
+        sql = (
+            f"INSERT INTO {table} ({col_sql}) VALUES ({marks}) "
+            f"ON CONFLICT ({', '.join(keys)}) DO UPDATE SET {updates}"
+        )
+        values = [tuple(_sql_value(r.get(c)) for c in columns) for r in rows]
+        with self._write(table) as stamps:
+            self.conn.executemany(sql, values)
+        return tuple(stamps)
+
+
+@st.cache_resource
+def get_storage():
+    if STORAGE_BACKEND == "sqlite":
+        return SqliteStorage(DB_FILE)
+    return CsvStorage()
+
+
+# ------------------------------
+# 표 캐시 (프로세스 전체에서 공유)
+# ------------------------------
+class TableCache:
+    # 파싱한 표를 세션끼리 나눠 쓰고, 저장소 stamp 가 바뀌었을 때만 다시 읽는다.
+    # 표에서 만든 파생 구조(매너온도 등)도 같은 버전에 묶어 둔다.
+    # 한 줄씩 고친 내용은 overlay 에 얹어 두고 파생 구조만 바로 고친다.
+    # 표 전체(DataFrame)가 필요할 때 한 번에 합치므로 클릭 한 번의 비용이 표 크기와 상관없다.
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.entries = {}
+        self.pending = {}  # 표 → {키: 줄}. 아직 저장소에 안 쓴 줄 (WriteBehind)
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _entry(stamp, df):
+        # overlay: 키 → (한 줄짜리 표, 그 줄). positions: 키 → df 안 그 줄의 라벨 (필요할 때 만든다).
+        # 합칠 때 남는 줄은 라벨이 그대로라 positions 는 고친 줄만 바꾸면 된다.
+        df = df.reset_index(drop=True)
+        return {"stamp": stamp, "df": df, "derived": {}, "overlay": {}, "positions": None, "next": len(df)}
+
+    def _fresh_entry(self, table, storage):
+        stamp = storage.stamp(table)
+        with self.lock:
+            entry = self.entries.get(table)
+            if entry is not None and entry["stamp"] == stamp:
+                self.hits += 1
+                return entry
+        entry = self._entry(stamp, _prepare_table(table, storage.load(table)))
+        with self.lock:
+            self.misses += 1
+            # 다시 읽은 표에도 아직 안 쓴 줄을 얹는다
+            for row in self.pending.get(table, {}).values():
+                self._apply_row(entry, table, row)
+            self.entries[table] = entry
+        return entry
+
+    def _frame(self, entry, table):
+        # overlay 를 표에 합친다 (고친 줄은 맨 뒤로 — 파일을 다시 읽었을 때와 같은 순서)
+        with self.lock:
+            overlay = entry["overlay"]
+            if overlay:
+                keys = list(TABLES[table][2])
+                df = entry["df"]
+                changed = list(overlay) if len(keys) > 1 else [k[0] for k in overlay]
+                same = df.set_index(keys).index.isin(changed)
+                labels = range(entry["next"], entry["next"] + len(overlay))
+                tail = pd.concat([frame for frame, _ in overlay.values()], ignore_index=True)
+                tail.index = labels
+                entry["df"] = pd.concat([df[~same], tail])
+                entry["next"] += len(overlay)
+                if entry["positions"] is not None:
+                    entry["positions"].update(zip(overlay, labels))
+                entry["overlay"] = {}
+            return entry["df"].reset_index(drop=True)
+
+    def get(self, table, storage):
+        # 호출한 쪽이 고쳐도 공유본은 그대로 (Copy-on-Write 얕은 복사)
+        entry = self._fresh_entry(table, storage)
+        return self._frame(entry, table)
+
+    def get_versioned(self, table, storage):
+        # (표, 그 표를 읽은 stamp). 고쳐 쓸 때 expected 로 넘긴다.
+        entry = self._fresh_entry(table, storage)
+        with self.lock:
+            return self._frame(entry, table), entry["stamp"]
+
+    def derived(self, table, key, builder, storage):
+        entry = self._fresh_entry(table, storage)
+        with self.lock:
+            obj = entry["derived"].get(key)
+            if obj is None:
+                obj = builder(self._frame(entry, table))
+                entry["derived"][key] = obj
+        return obj
+
+    def put(self, table, stamp, df):
+        with self.lock:
+            self.entries[table] = self._entry(stamp, df)
+
+    def apply_upsert(self, table, stamp_before, stamp_after, row):
+        # 내 쓰기 한 줄을 캐시된 표에 그대로 반영 (파일을 다시 읽지 않음).
+        # 쓰기 전에 이미 캐시가 낡아 있었다면 그냥 버린다.
+        with self.lock:
+            entry = self.entries.get(table)
+            if entry is None or entry["stamp"] != stamp_before:
+                self.entries.pop(table, None)
+                return
+            self._apply_row(entry, table, row)
+            entry["stamp"] = stamp_after
+
+    def _old_row(self, entry, table, key):
+        if key in entry["overlay"]:
+            return entry["overlay"][key][1]
+        if entry["positions"] is None:
+            df = entry["df"]
+            keys = list(zip(*(df[k].tolist() for k in TABLES[table][2])))
+            entry["positions"] = dict(zip(keys, df.index))
+        label = entry["positions"].get(key)
+        return None if label is None else entry["df"].loc[label]
+
+    def _apply_row(self, entry, table, row):
+        key = tuple(row[k] for k in TABLES[table][2])
+        old_row = self._old_row(entry, table, key)
+        # 다시 읽었을 때와 똑같도록 빈 문자열은 NaN 으로
+        frame = _prepare_table(table, pd.DataFrame([{c: (np.nan if v == "" else v) for c, v in row.items()}]))
+        row = frame.iloc[0]
+        entry["overlay"].pop(key, None)
+        entry["overlay"][key] = (frame, row)
+        for name, obj in list(entry["derived"].items()):
+            if hasattr(obj, "apply_upsert"):
+                obj.apply_upsert(row, old_row)
+            else:
+                del entry["derived"][name]
+
+    def add_pending(self, table, row):
+        # 저장소에 쓰기 전에 캐시된 표에만 먼저 반영한다 (stamp 는 그대로)
+        key = tuple(row[k] for k in TABLES[table][2])
+        with self.lock:
+            self.pending.setdefault(table, {})[key] = row
+            entry = self.entries.get(table)
+            if entry is not None:
+                self._apply_row(entry, table, row)
+
+    def commit_pending(self, table, rows, stamp_before, stamp_after):
+        # rows 가 저장소에 쓰였다. 캐시가 쓰기 직전 버전이었다면 (그 줄들은 이미 얹혀 있으니) stamp 만 올린다.
+        keys = TABLES[table][2]
+        with self.lock:
+            pending = self.pending.get(table, {})
+            for row in rows:
+                key = tuple(row[k] for k in keys)
+                # 그 사이 같은 키로 새 줄이 들어왔으면 그건 남겨 둔다
+                if pending.get(key) is row:
+                    del pending[key]
+            entry = self.entries.get(table)
+            if entry is not None and entry["stamp"] == stamp_before:
+                entry["stamp"] = stamp_after
+
+    def invalidate(self, table=None):
+        with self.lock:
+            if table is None:
+                self.entries.clear()
+            else:
+                self.entries.pop(table, None)
+
+    def stats(self):
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 3) if total else 0.0,
+                "rows": {table: len(entry["df"]) for table, entry in self.entries.items()},
+            }
+
+
+@st.cache_resource
+def get_table_cache():
+    return TableCache()
+
+
+class WriteBehind:
+    # ♥/패스, 별점 이벤트를 받아 캐시에는 바로 반영하고, 저장소에는 뒤쪽 스레드가 모아서 쓴다.
+    # batch 건이 모이거나 첫 건이 들어온 뒤 interval_ms 가 지나면 한 번에 쓴다.
+    # 프로세스가 정상 종료할 때(atexit) 남은 것을 모두 쓴다. 강제 종료되면 마지막 묶음은 잃을 수 있다.
+    def __init__(self, batch=WRITE_BEHIND_BATCH, interval_ms=WRITE_BEHIND_MS):
+        self.batch = max(1, batch)
+        self.interval = interval_ms / 1000
+        self.queue = deque()
+        self.cond = threading.Condition()
+        self.write_lock = threading.Lock()  # 스레드와 flush() 가 묶음 순서를 바꾸지 않게
+        self.thread = None
+        self.closed = False
+        self.errors = 0
+        atexit.register(self.close)
+
+    def submit(self, table, row):
+        get_table_cache().add_pending(table, row)
+        with self.cond:
+            if self.closed:
+                raise RuntimeError("write-behind queue is closed")
+            self.queue.append((table, row))
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name="souly-write-behind", daemon=True)
+                self.thread.start()
+            self.cond.notify()
+
+    def _run(self):
+        while True:
+            with self.cond:
+                self.cond.wait_for(lambda: self.queue or self.closed)
+                if self.closed:
+                    return
+                deadline = time.monotonic() + self.interval
+                self.cond.wait_for(
+                    lambda: len(self.queue) >= self.batch or self.closed,
+                    timeout=max(0.0, deadline - time.monotonic()),
+                )
+            try:
+                self.flush()
+            except Exception:
+                # 저장소 오류: 줄은 큐 앞으로 되돌렸으니 잠시 뒤 다시 쓴다
+                logging.getLogger("souly").exception("write-behind flush failed")
+                time.sleep(self.interval)
+
+    def flush(self):
+        # 지금까지 받은 이벤트를 모두 저장소에 쓴다 (표마다 한 번)
+        with self.write_lock:
+            with self.cond:
+                items = list(self.queue)
+                self.queue.clear()
+            if not items:
+                return 0
+            by_table = {}
+            for table, row in items:
+                by_table.setdefault(table, []).append(row)
+            storage = get_storage()
+            cache = get_table_cache()
+            done = set()
+            try:
+                for table, rows in by_table.items():
+                    with timed_block(f"write_behind.{table}") as timer:
+                        timer.rows = len(rows)
+                        before, after = storage.upsert_many(table, rows)
+                    cache.commit_pending(table, rows, before, after)
+                    done.add(table)
+            except Exception:
+                # 못 쓴 표의 줄은 순서 그대로 큐 앞에 되돌린다 (캐시에는 계속 얹혀 있다)
+                self.errors += 1
+                with self.cond:
+                    self.queue.extendleft(reversed([(t, r) for t, r in items if t not in done]))
+                raise
+            return len(items)
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+        if self.thread is not None:
+            self.thread.join(timeout=5)
+        try:
+            self.flush()
+        except Exception:
+            # 종료 중에는 다시 던져도 받을 곳이 없다. 남은 줄을 한 줄씩 직접 써 본다
+            log = logging.getLogger("souly")
+            log.exception("write-behind flush failed at exit; writing %d rows one by one", len(self.queue))
+            storage = get_storage()
+            with self.cond:
+                items = list(self.queue)
+                self.queue.clear()
+            for table, row in items:
+                try:
+                    storage.upsert_many(table, [row])
+                except Exception:
+                    log.exception("write-behind dropped %s row %r", table, row)
+
+
+@st.cache_resource
+def get_write_queue():
+    return WriteBehind()
+
+
+def flush_writes():
+    # 뒤에서 쓰는 중인 ♥/패스, 별점을 지금 저장소에 모두 쓴다 (배치 작업 / 테스트 / 종료 전)
+    if WRITE_BEHIND:
+        return get_write_queue().flush()
+    return 0
+
+
+def cache_stats():
+    return get_table_cache().stats()
+
+
+def _load_table(table):
+    return get_table_cache().get(table, get_storage())
+
+
+def _prepare_table(table, df):
+    # 프로필 표에는 로드할 때 점수 계산용 컬럼을 붙인다
+    if table != "profiles":
+        return df
+    if "team_code" not in df.columns:
+        df = df.assign(team_code="")
+    return add_score_columns(df)
+
+
+def _save_table(table, df, expected=None):
+    # expected(읽을 때의 stamp)를 주면 그 사이 다른 세션이 쓴 경우 StaleWriteError
+    storage = get_storage()
+    df = df.drop(columns=SCORE_COLUMNS, errors="ignore")
+    stamp = storage.save(table, df, expected=expected)
+    get_table_cache().put(table, stamp, _prepare_table(table, df.copy()))
+
+
+def update_table(table, change, retries=WRITE_RETRIES):
+    # 읽기 → change(df) → 쓰기. 그 사이 다른 세션이 먼저 썼으면 덮어쓰지 않고 새로 읽어서 다시 한다.
+    def attempt():
+        df, stamp = get_table_cache().get_versioned(table, get_storage())
+        _save_table(table, change(df), expected=stamp)
+
+    _retry_stale(table, attempt, retries)
+
+
+def _retry_stale(table, attempt, retries=WRITE_RETRIES):
+    # 처음 몇 번은 잠금 없이(낙관적으로) 해 보고, 계속 부딪히면 표 잠금을 잡고 한 번 더.
+    # 잠금을 잡은 동안에는 아무도 못 쓰므로 마지막 시도는 꼭 성공한다.
+    for n in range(retries):
+        try:
+            return attempt()
+        except StaleWriteError:
+            if METRICS_ENABLED:
+                get_metrics().record(f"{table}.stale_retry", 0.0)
+            # 같이 부딪힌 세션끼리 다시 부딪히지 않게 조금씩 다르게, 점점 길게 쉰다
+            time.sleep(random.uniform(0, 0.01 * 2 ** n))
+    with get_storage().write_lock(table):
+        return attempt()
+
+
+def _patch_table(table, deletes, rows, expected=None):
+    # 몇 사람 몫의 줄만 지우고 다시 쓴다. 캐시된 표도 같은 방식으로 고친다.
+    storage = get_storage()
+    cache = get_table_cache()
+    df, stamp = cache.get_versioned(table, storage)
+    before, after = storage.patch(table, deletes, rows, expected=expected)
+    if before != stamp:
+        # 읽은 뒤 다른 세션이 이 표를 고쳤다. 저장소에는 잠금 안에서 반영됐으니 캐시만 버린다.
+        cache.invalidate(table)
+        return
+    df = pd.concat([df[~_match_any(df, deletes)], pd.DataFrame(rows, columns=TABLES[table][1])], ignore_index=True)
+    cache.put(table, after, df)
+
+
+def _upsert_table(table, row):
+    before, after = get_storage().upsert(table, row)
+    get_table_cache().apply_upsert(table, before, after, row)
+
+
+def migrate_csv_to_sqlite(db_path=DB_FILE):
+    # 기존 responses.csv / decisions.csv / ratings.csv 를 SQLite 로 한 번에 옮긴다
+    source = CsvStorage()
+    target = SqliteStorage(db_path)
+    counts = {}
+    for table in TABLES:
+        df = source.load(table)
+        if table == "profiles" and "team_code" not in df.columns:
+            df["team_code"] = ""
+        target.upsert_many(table, df.to_dict("records"))
+        counts[table] = len(df)
+    return counts
 
 
 # ------------------------------
 # 기본 유틸
 # ------------------------------
+@timed("load_data", rows=len)
 def load_data():
-    base_cols = [
-        "timestamp", "user_id", "purpose",
-        "match_mode", "group_size",
-        "group_scope", "group_name",
-        "self_age", "self_gender",
-        "self_personality", "self_appearance",
-        "self_body_type", "self_mbti",
-        "self_height",
-        "pref_min_age", "pref_max_age",
-        "pref_gender", "pref_personality",
-        "pref_appearance", "pref_body_type",
-        "pref_min_height", "pref_max_height",
-        "blacklist_personality", "blacklist_appearance",
-        "contact_info",
-    ]
-    all_cols = base_cols + ["team_code"]
+    df = _load_table("profiles")
+    if "team_code" not in df.columns:
+        df["team_code"] = ""
+    return df
 
-    if os.path.exists(DATA_FILE):
-        df = pd.read_csv(DATA_FILE)
-        if "team_code" not in df.columns:
-            df["team_code"] = ""
-        return df
-    else:
-        return pd.DataFrame(columns=all_cols)
 
+class ProfileIndex:
+    # user_id → 행 위치 (같은 id 가 여러 줄이면 첫 줄). 표가 바뀌면 다시 만든다.
+    def __init__(self, df):
+        self.df = df
+        ids = df["user_id"].tolist()
+        self.positions = dict(zip(reversed(ids), range(len(ids) - 1, -1, -1)))
 
-def save_data(df):
-    df.to_csv(DATA_FILE, index=False)
 
+def get_profile_index():
+    return get_table_cache().derived("profiles", "profile_index", ProfileIndex, get_storage())
 
+
+def get_profile(user_id):
+    # user_id 로 프로필 한 줄 (없으면 None)
+    index = get_profile_index()
+    pos = index.positions.get(user_id)
+    return None if pos is None else index.df.iloc[pos]
+
+
+@timed("load_profile_columns", rows=len)
+def load_profile_columns(columns=SCORING_COLUMNS):
+    # 캐시를 거치지 않고 필요한 컬럼만 읽는다 (배치처럼 한 번 읽고 끝나는 곳에서)
+    return get_storage().load_columns("profiles", columns)
+
+
+@timed("save_data")
+def save_data(df, expected=None):
+    _save_table("profiles", df, expected)
+
+
+@timed("upsert_profile")
+def upsert_profile(row):
+    _upsert_table("profiles", row)
+    refresh_candidate_lists(row["user_id"])
+
+
+@timed("load_decisions", rows=len)
 def load_decisions():
-    if os.path.exists(DECISIONS_FILE):
-        return pd.read_csv(DECISIONS_FILE)
-    return pd.DataFrame(columns=["timestamp", "from_user", "to_user", "decision"])
+    return _load_table("decisions")
 
 
-def save_decisions(df):
-    df.to_csv(DECISIONS_FILE, index=False)
+@timed("save_decisions")
+def save_decisions(df, expected=None):
+    _save_table("decisions", df, expected)
+
+
+@timed("upsert_decision")
+def upsert_decision(row):
+    if WRITE_BEHIND:
+        get_write_queue().submit("decisions", row)
+    else:
+        _upsert_table("decisions", row)
 
 
+@timed("load_ratings", rows=len)
 def load_ratings():
-    if os.path.exists(RATINGS_FILE):
-        return pd.read_csv(RATINGS_FILE)
-    return pd.DataFrame(columns=["timestamp", "from_user", "to_user", "rating"])
+    return _load_table("ratings")
 
 
-def save_ratings(df):
-    df.to_csv(RATINGS_FILE, index=False)
+@timed("save_ratings")
+def save_ratings(df, expected=None):
+    _save_table("ratings", df, expected)
+
+
+@timed("upsert_rating")
+def upsert_rating(row):
+    if WRITE_BEHIND:
+        get_write_queue().submit("ratings", row)
+    else:
+        _upsert_table("ratings", row)
 
 
 def split_tags(val):
@@ -74,14 +1198,58 @@ def split_tags(val):
     return s.split(";")
 
 
+# ------------------------------
+# 매너온도 집계
+# ------------------------------
+class MannerTable:
+    # 받은 별점의 합계/개수를 유저별로 들고 있다가 user_id → 매너온도 로 바로 조회
+    def __init__(self, ratings):
+        self.total = {}
+        self.count = {}
+        self.temps = {}
+        if not ratings.empty:
+            grouped = ratings.groupby("to_user")["rating"].agg(["sum", "count"])
+            self.total = grouped["sum"].to_dict()
+            self.count = grouped["count"].to_dict()
+            for user_id in self.count:
+                self._refresh(user_id)
+
+    def _refresh(self, user_id):
+        n = self.count.get(user_id, 0)
+        if n:
+            self.temps[user_id] = round(np.float64(self.total[user_id]) / n * 10, 1)  # 1~10점 → 10배
+        else:
+            self.temps.pop(user_id, None)
+
+    def get(self, user_id) -> float:
+        return self.temps.get(user_id, 50.0)
+
+    def temperatures(self, user_ids):
+        # map(dict) 는 부를 때마다 dict 전체를 Series 로 바꾼다 → 후보가 적을 때도 유저 수만큼 든다
+        temps = self.temps
+        return pd.Series([temps.get(u, 50.0) for u in user_ids.tolist()], index=user_ids.index, dtype=float)
+
+    def apply_rating(self, to_user, rating, old_rating=None):
+        # 새 별점 저장 (같은 사람이 다시 매기면 이전 별점을 빼고 교체)
+        self.total[to_user] = self.total.get(to_user, 0) + rating
+        if old_rating is None:
+            self.count[to_user] = self.count.get(to_user, 0) + 1
+        else:
+            self.total[to_user] -= old_rating
+        self._refresh(to_user)
+
+    def apply_upsert(self, row, old_row):
+        old_rating = old_row["rating"] if old_row is not None else None
+        self.apply_rating(row["to_user"], row["rating"], old_rating)
+
+
+def get_manner_table():
+    return get_table_cache().derived("ratings", "manner", MannerTable, get_storage())
+
+
+@timed("get_user_manner_temperature")
 def get_user_manner_temperature(user_id: str) -> float:
-    df = load_ratings()
-    if df.empty:
-        return 50.0
-    user_ratings = df[df["to_user"] == user_id]["rating"]
-    if len(user_ratings) == 0:
-        return 50.0
-    return round(user_ratings.mean() * 10, 1)  # 1~10점 → 10배
+    return get_manner_table().get(user_id)
 
 
 def get_prev(prev_row, col, default):
@@ -104,6 +1272,7 @@ def get_prev(prev_row, col, default):
 # ------------------------------
 # 매칭 점수 계산
 # ------------------------------
+@timed("calc_match_score")
 def calc_match_score(me, other):
     score = 0.0
 
@@ -237,25 +1406,1706 @@ def calc_match_score(me, other):
     return score
 
 
+# ------------------------------
+# 매칭 점수 일괄 계산 (벡터화)
+# ------------------------------
+# 태그는 로드할 때 한 번만 정수 비트마스크로 바꿔서 프로필 표 옆 컬럼으로 붙여 둔다.
+# 겹치는 개수 = popcount(a & b), 블랙리스트 = (a & b) != 0
+TAG_FAMILIES = {
+    "personality": PERSONALITY_OPTIONS,
+    "appearance": ["상관없음"] + APPEARANCE_OPTIONS,
+    "body": ["상관없음"] + BODY_TYPE_OPTIONS,
+}
+
+# (비트마스크 컬럼, 원래 컬럼, 태그 묶음, 여러 개 선택인지)
+MASK_COLUMNS = [
+    ("_self_p", "self_personality", "personality", True),
+    ("_pref_p", "pref_personality", "personality", True),
+    ("_black_p", "blacklist_personality", "personality", True),
+    ("_self_a", "self_appearance", "appearance", False),
+    ("_pref_a", "pref_appearance", "appearance", True),
+    ("_black_a", "blacklist_appearance", "appearance", True),
+    ("_self_b", "self_body_type", "body", False),
+    ("_pref_b", "pref_body_type", "body", True),
+]
+SCORE_COLUMNS = [c for c, _, _, _ in MASK_COLUMNS] + [
+    "_gs", "_is_team", "_team", "_restricted", "_pref_a_any", "_pref_b_any", "_tag_overflow",
+]
+
+
+class TagVocab:
+    # 태그 → 비트. 보기에 없는 태그가 들어오면 뒤에 비트를 하나씩 더 붙인다.
+    # 64 개가 다 차면 그 뒤 태그는 비트 없이(0) overflow 에 모아 두고, 그 태그가 있는 줄은
+    # 벡터 점수 대신 calc_match_score 로 계산한다 (_tag_overflow 컬럼).
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.bits = {
+            family: {tag: 1 << i for i, tag in enumerate(options)}
+            for family, options in TAG_FAMILIES.items()
+        }
+        self.overflow = {family: set() for family in TAG_FAMILIES}
+
+    def bit(self, family, tag):
+        bits = self.bits[family]
+        b = bits.get(tag)
+        if b is None:
+            with self.lock:
+                b = bits.get(tag)
+                if b is None:
+                    if len(bits) >= 64:
+                        if tag not in self.overflow[family]:
+                            self.overflow[family].add(tag)
+                            logging.getLogger("souly").warning(
+                                "tag bits full for %s; scoring rows with %r exactly", family, tag
+                            )
+                        return 0
+                    b = bits[tag] = 1 << len(bits)
+        return b
+
+    def mask(self, family, val, multi):
+        if not multi:
+            # 외모/체형 한 개 값은 쪼개지 않고 그대로 비교한다 (문자열이 아니면 0)
+            return self.bit(family, val) if isinstance(val, str) else 0
+        m = 0
+        for tag in split_tags(val):
+            m |= self.bit(family, tag)
+        return m
+
+    def overflowed(self, family, val, multi):
+        # 비트를 못 받은 태그가 들어 있는지
+        over = self.overflow[family]
+        if not over:
+            return False
+        if not multi:
+            return isinstance(val, str) and val in over
+        return any(tag in over for tag in split_tags(val))
+
+
+@st.cache_resource
+def get_tag_vocab():
+    return TagVocab()
+
+
+def _nonblank_str(col):
+    # isinstance(v, str) and v.strip() 을 열 단위로
+    try:
+        return col.str.strip().str.len().gt(0).fillna(False).astype(bool)
+    except AttributeError:
+        return pd.Series(False, index=col.index)
+
+
+def _safe_int(val):
+    try:
+        return float(int(val))
+    except Exception:
+        return np.nan
+
+
+def _int_column(col):
+    if pd.api.types.is_numeric_dtype(col):
+        vals = col.astype(float)
+        return np.trunc(vals.where(np.isfinite(vals)))
+    return col.map(_safe_int).astype(float)
+
+
+def _team_code(val):
+    return str(val or "").strip()
+
+
+def add_score_columns(df):
+    # 점수 계산에 쓰는 파생 컬럼(비트마스크 등)을 붙인 복사본
+    vocab = get_tag_vocab()
+    out = df.copy()
+    for mask_col, col, family, multi in MASK_COLUMNS:
+        out[mask_col] = np.array(
+            [vocab.mask(family, v, multi) for v in df[col]], dtype=np.uint64
+        )
+    any_a = np.uint64(vocab.bit("appearance", "상관없음"))
+    any_b = np.uint64(vocab.bit("body", "상관없음"))
+    out["_pref_a_any"] = (out["_pref_a"] == 0) | ((out["_pref_a"] & any_a) != 0)
+    out["_pref_b_any"] = (out["_pref_b"] == 0) | ((out["_pref_b"] & any_b) != 0)
+    out["_gs"] = _int_column(df["group_size"])
+    out["_is_team"] = df["match_mode"].astype(str).str.contains("팀 매칭", regex=False)
+    team_codes = df["team_code"] if "team_code" in df.columns else pd.Series("", index=df.index)
+    out["_team"] = team_codes.map(_team_code)
+    out["_restricted"] = (df["group_scope"] == "특정 그룹 내에서") & _nonblank_str(df["group_name"])
+    out["_tag_overflow"] = False
+    for _, col, family, multi in MASK_COLUMNS:
+        if vocab.overflow[family]:
+            out["_tag_overflow"] |= np.array([vocab.overflowed(family, v, multi) for v in df[col]], dtype=bool)
+    return out
+
+
+def _with_score_columns(df):
+    if "_self_p" in df.columns:
+        return df
+    return add_score_columns(df)
+
+
+if hasattr(np, "bitwise_count"):
+    _popcount = np.bitwise_count
+else:
+    _POPCOUNT_TABLE = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+    def _popcount(arr):
+        arr = np.ascontiguousarray(arr, dtype=np.uint64)
+        return _POPCOUNT_TABLE[arr.view(np.uint8)].reshape(arr.shape + (8,)).sum(axis=-1)
+
+
+def _score_fields(df):
+    def num(col):
+        return pd.to_numeric(df[col], errors="coerce").to_numpy(dtype=float)
+
+    fields = {
+        "user_id": df["user_id"].to_numpy(dtype=object),
+        "purpose": df["purpose"].to_numpy(dtype=object),
+        "mode": df["match_mode"].to_numpy(dtype=object),
+        "group": df["group_name"].to_numpy(dtype=object),
+        "gender": df["self_gender"].to_numpy(dtype=object),
+        "pref_gender": df["pref_gender"].to_numpy(dtype=object),
+        "team": df["_team"].to_numpy(dtype=object),
+        "gs": df["_gs"].to_numpy(dtype=float),
+        "is_team": df["_is_team"].to_numpy(dtype=bool),
+        "restricted": df["_restricted"].to_numpy(dtype=bool),
+        "pref_a_any": df["_pref_a_any"].to_numpy(dtype=bool),
+        "pref_b_any": df["_pref_b_any"].to_numpy(dtype=bool),
+        "overflow": df["_tag_overflow"].to_numpy(dtype=bool),
+    }
+    for col in ("self_age", "self_height", "pref_min_age", "pref_max_age", "pref_min_height", "pref_max_height"):
+        fields[col] = num(col)
+    for mask_col, _, _, _ in MASK_COLUMNS:
+        fields[mask_col] = df[mask_col].to_numpy(dtype=np.uint64)
+    return fields
+
+
+def _pair_scores(m, o, mt_m, mt_o):
+    # m(나) 와 o(상대) 의 같은 위치끼리 calc_match_score 와 같은 점수를 낸다.
+    # 한쪽이 길이 1 이면 나머지 전체에 브로드캐스트된다. 제외된 쌍은 -1.
+    zero = np.uint64(0)
+
+    # 1~2. 목적 / 매칭 방식
+    ok = (o["purpose"] == m["purpose"]) & (o["mode"] == m["mode"])
+
+    # 3. 다인원/팀 매칭 인원 수
+    ok &= (m["mode"] == "1:1 매칭") | (o["gs"] == m["gs"])
+
+    # 4. 팀 매칭 같은 팀 코드 제외
+    ok &= ~(m["is_team"] & o["is_team"] & (m["team"] != "") & (o["team"] == m["team"]))
+
+    # 5. 그룹 필터 (양쪽 모두)
+    ok &= ~((m["restricted"] | o["restricted"]) & (o["group"] != m["group"]))
+
+    # 6. 내 블랙리스트
+    ok &= (m["_black_p"] & o["_self_p"]) == zero
+    ok &= (m["_black_a"] & o["_self_a"]) == zero
+
+    # ===== 내가 원하는 조건 vs 상대 실제 =====
+    ok &= (o["self_age"] >= m["pref_min_age"]) & (o["self_age"] <= m["pref_max_age"])
+    points = 10
+
+    any_gender = m["pref_gender"] == "상관없음"
+    ok &= any_gender | (o["gender"] == m["pref_gender"])
+    points = points + np.where(any_gender, 3, 5)
+
+    in_height = (o["self_height"] >= m["pref_min_height"]) & (o["self_height"] <= m["pref_max_height"])
+    points = points + np.where(in_height, 4, 0)
+
+    body_hit = (m["_pref_b"] & o["_self_b"]) != zero
+    points = points + np.where(m["pref_b_any"], 1, np.where(body_hit, 4, -1))
+
+    points = points + _popcount(m["_pref_p"] & o["_self_p"]).astype(np.int64) * 3
+
+    look_hit = (m["_pref_a"] & o["_self_a"]) != zero
+    points = points + np.where(m["pref_a_any"], 1, np.where(look_hit, 3, 0))
+
+    # ===== 상대가 원하는 조건 vs 내 실제 =====
+    in_age = (o["pref_min_age"] <= m["self_age"]) & (o["pref_max_age"] >= m["self_age"])
+    points = points + np.where(in_age, 8, -5)
+
+    points = points + np.where(
+        o["pref_gender"] == "상관없음", 2, np.where(o["pref_gender"] == m["gender"], 5, -5)
+    )
+
+    points = points + _popcount(o["_pref_p"] & m["_self_p"]).astype(np.int64) * 2
+
+    look_hit = (o["_pref_a"] & m["_self_a"]) != zero
+    points = points + np.where(o["pref_a_any"], 1, np.where(look_hit, 2, 0))
+
+    body_hit = (o["_pref_b"] & m["_self_b"]) != zero
+    points = points + np.where(o["pref_b_any"], 1, np.where(body_hit, 2, 0))
+
+    # 매너온도 보너스
+    score = points + (mt_m + mt_o) / 50.0
+    return np.where(ok, score, -1.0)
+
+
+def _manner_array(user_ids):
+    return get_manner_table().temperatures(pd.Series(user_ids, dtype=object)).to_numpy(dtype=float)
+
+
+def score_pairs(left, right):
+    # left 의 i 번째 사람이 right 의 i 번째 사람을 봤을 때의 점수 (길이 1 이면 브로드캐스트)
+    m = _score_fields(_with_score_columns(left))
+    o = _score_fields(_with_score_columns(right))
+    scores = _pair_scores(m, o, _manner_array(m["user_id"]), _manner_array(o["user_id"]))
+    if m["overflow"].any() or o["overflow"].any():
+        # 비트를 못 받은 태그가 낀 쌍만 한 쌍씩 다시 계산
+        scores = np.array(np.broadcast_to(scores, max(len(left), len(right))), dtype=float)
+        over = np.broadcast_to(m["overflow"], scores.shape) | np.broadcast_to(o["overflow"], scores.shape)
+        for i in np.flatnonzero(over):
+            me = left.iloc[i if len(left) > 1 else 0]
+            scores[i] = calc_match_score(me, right.iloc[i if len(right) > 1 else 0])
+    return scores
+
+
+def score_matrix(left, right):
+    # left 의 모든 사람 × right 의 모든 사람 점수표, 모양 (len(left), len(right))
+    m = _score_fields(_with_score_columns(left))
+    o = _score_fields(_with_score_columns(right))
+    mt_m = _manner_array(m["user_id"])[:, None]
+    mt_o = _manner_array(o["user_id"])[None, :]
+    over_m, over_o = m["overflow"], o["overflow"]
+    m = {key: val[:, None] for key, val in m.items()}
+    o = {key: val[None, :] for key, val in o.items()}
+    scores = _pair_scores(m, o, mt_m, mt_o)
+    if over_m.any() or over_o.any():
+        scores = np.array(scores, dtype=float)
+        for i, j in zip(*np.nonzero(over_m[:, None] | over_o[None, :])):
+            scores[i, j] = calc_match_score(left.iloc[i], right.iloc[j])
+    return scores
+
+
+@timed("score_candidates", rows=len)
+def score_candidates(me, others_df):
+    # calc_match_score 와 같은 규칙을 후보 전체에 한 번에 적용한다.
+    # 제외된 후보는 -1, 나머지는 calc_match_score 와 같은 점수.
+    if others_df.empty:
+        return pd.Series(dtype=float, index=others_df.index)
+    scores = score_pairs(me.to_frame().T, others_df)
+    return pd.Series(np.broadcast_to(scores, len(others_df)), index=others_df.index)
+
+
+# ------------------------------
+# 후보 블로킹 인덱스
+# ------------------------------
+def blocking_key(row):
+    # calc_match_score 앞부분의 동등 비교(목적, 매칭 방식, 다인원/팀 인원 수)로 만든 칸 이름.
+    # 어떤 상대와도 매칭될 수 없으면 None.
+    purpose = row["purpose"]
+    match_mode = row["match_mode"]
+    if pd.isna(purpose) or pd.isna(match_mode):
+        return None
+    size = None
+    if match_mode != "1:1 매칭":
+        size = _safe_int(row["group_size"])
+        if np.isnan(size):
+            return None
+    return (purpose, match_mode, size)
+
+
+def _restricted_group(row):
+    group_name = row["group_name"]
+    if row["group_scope"] == "특정 그룹 내에서" and isinstance(group_name, str) and group_name.strip():
+        return group_name
+    return None
+
+
+class CandidateIndex:
+    # blocking_key 칸마다
+    #   open        : 그룹 제한이 없는 사람
+    #   restricted  : "특정 그룹 내에서" 인 사람 (그룹 이름별)
+    #   open_named  : 그룹 제한은 없지만 그룹 이름이 적혀 있는 사람 (그룹 이름별)
+    def __init__(self, profiles):
+        self.buckets = {}
+        self.where = {}
+        cols = ["user_id", "purpose", "match_mode", "group_size", "group_scope", "group_name"]
+        for row in profiles[cols].to_dict("records"):
+            self._add(row)
+
+    def _add(self, row):
+        key = blocking_key(row)
+        if key is None:
+            return
+        user_id = row["user_id"]
+        bucket = self.buckets.setdefault(key, {"open": set(), "restricted": {}, "open_named": {}})
+        group = _restricted_group(row)
+        if group is not None:
+            bucket["restricted"].setdefault(group, set()).add(user_id)
+            self.where[user_id] = (key, "restricted", group)
+        else:
+            bucket["open"].add(user_id)
+            name = row["group_name"] if isinstance(row["group_name"], str) else None
+            if name is not None:
+                bucket["open_named"].setdefault(name, set()).add(user_id)
+            self.where[user_id] = (key, "open", name)
+
+    def _remove(self, user_id):
+        place = self.where.pop(user_id, None)
+        if place is None:
+            return
+        key, kind, name = place
+        bucket = self.buckets[key]
+        if kind == "restricted":
+            bucket["restricted"][name].discard(user_id)
+        else:
+            bucket["open"].discard(user_id)
+            if name is not None:
+                bucket["open_named"][name].discard(user_id)
+
+    def apply_upsert(self, row, old_row):
+        self._remove(row["user_id"])
+        self._add(row)
+
+    def partitions(self):
+        # blocking_key → 그 칸의 user_id 목록
+        parts = {}
+        for user_id, (key, _, _) in self.where.items():
+            parts.setdefault(key, []).append(user_id)
+        return parts
+
+    def candidates_for(self, me):
+        key = blocking_key(me)
+        bucket = self.buckets.get(key) if key is not None else None
+        if bucket is None:
+            return set()
+        group = _restricted_group(me)
+        if group is not None:
+            ids = bucket["restricted"].get(group, set()) | bucket["open_named"].get(group, set())
+        else:
+            ids = set(bucket["open"])
+            if isinstance(me["group_name"], str):
+                ids |= bucket["restricted"].get(me["group_name"], set())
+        ids.discard(me["user_id"])
+        return ids
+
+
+def get_candidate_index():
+    return get_table_cache().derived("profiles", "candidate_index", CandidateIndex, get_storage())
+
+
+# ------------------------------
+# 매칭 후보 점수 (배치 결과 + 실시간)
+# ------------------------------
+class BatchResults:
+    # match_topk 표를 user_id → (후보, 점수) 구간으로 묶어 둔다.
+    # rank 0 줄은 그 사람 목록의 기준 시각 (이 시각 이후에 프로필을 고쳤으면 목록이 낡은 것).
+    # rank 0 줄의 score 는 배치를 돌린 K, 음수(-K)이면 목록을 버린 사람 (다음에 볼 때 실시간으로 계산).
+    def __init__(self, topk):
+        self.spans = {}
+        self.synced_at = {}
+        self.stale = set()
+        self.top_k = BATCH_TOP_K
+        if topk.empty:
+            return
+        header = topk["rank"] == 0
+        heads = topk[header]
+        if (heads["score"] == 0).any():
+            # K 를 적기 전에 만든 표 (기준 줄 score 가 0 / -1): 가장 긴 목록으로 어림한다
+            self.top_k = max(1, int(topk["rank"].max()))
+        elif len(heads):
+            self.top_k = max(1, int(heads["score"].abs().max()))
+        self.synced_at = dict(zip(heads["user_id"], heads["computed_at"].astype(str)))
+        self.stale = set(heads.loc[heads["score"] < 0, "user_id"])
+        topk = topk[~header].sort_values(["user_id", "rank"], kind="stable")
+        self.candidates = topk["candidate_id"].to_numpy()
+        self.scores = topk["score"].to_numpy(dtype=float)
+        users = topk["user_id"].to_numpy()
+        starts = np.flatnonzero(np.r_[True, users[1:] != users[:-1]])
+        ends = np.r_[starts[1:], len(users)]
+        self.spans = dict(zip(users[starts], zip(starts, ends)))
+
+    def current(self, user_id):
+        start, end = self.spans.get(user_id, (0, 0))
+        return list(zip(self.candidates[start:end], self.scores[start:end]))
+
+    def lookup(self, me):
+        # 목록이 없거나 (배치 이후 가입 / 부분 갱신 때 지워짐) 목록 이후에 프로필을 고쳤으면 None
+        synced_at = self.synced_at.get(me["user_id"])
+        if synced_at is None or str(me["timestamp"]) > synced_at or me["user_id"] in self.stale:
+            return None
+        start, end = self.spans.get(me["user_id"], (0, 0))
+        return pd.Series(self.scores[start:end], index=self.candidates[start:end])
+
+    def changed_ids(self, df):
+        # 목록 기준 시각 이후에 바뀐(또는 목록이 없는) 사람들 → 다른 사람 목록에서도 실시간으로 다시 계산
+        synced = df["user_id"].map(self.synced_at)
+        changed = synced.isna() | (df["timestamp"].astype(str) > synced.fillna(""))
+        return set(df.loc[changed, "user_id"])
+
+
+def get_batch_results():
+    return get_table_cache().derived("match_topk", "batch_results", BatchResults, get_storage())
+
+
+def live_match_scores(me, others):
+    # (user_id, 점수) 를 하나씩 내보낸다 (양수만)
+    scores = score_candidates(me, others).to_numpy()
+    positive = scores > 0
+    return zip(others["user_id"].to_numpy()[positive], scores[positive])
+
+
+def iter_match_scores(me, df):
+    # 배치 결과가 있으면 그걸 쓰고, 배치 이후에 바뀐 후보만 실시간으로 다시 계산한다.
+    # 배치 결과가 없는데 칸이 아주 크면 (SOULY_ANN=1) 근사 검색으로 고른 후보만 계산한다.
+    batch = get_batch_results()
+    cached = batch.lookup(me)
+    if cached is None and ANN_ENABLED and ann_pool_size(me) >= ANN_MIN_POOL:
+        yield from ann_match_scores(me)
+        return
+    candidate_ids = get_candidate_index().candidates_for(me)
+    others = df[df["user_id"].isin(candidate_ids)]
+    if cached is None:
+        yield from live_match_scores(me, others)
+        return
+    # 다른 칸으로 옮겨 간 사람도 빼야 하므로 바뀐 사람은 전체 표에서 찾는다
+    changed_ids = batch.changed_ids(df)
+    for candidate_id, score in cached.items():
+        if candidate_id not in changed_ids:
+            yield candidate_id, score
+    yield from live_match_scores(me, others[others["user_id"].isin(changed_ids)])
+
+
+def _rank_key(pair):
+    # 점수 높은 순, 같으면 user_id 순
+    return (-pair[1], str(pair[0]))
+
+
+def top_k_matches(pairs, k):
+    # 크기 k 힙으로 상위 k 개만 골라 순서대로 돌려준다
+    return heapq.nsmallest(k, pairs, key=_rank_key)
+
+
+# ------------------------------
+# 근사 후보 검색 (프로필 임베딩 + IVF)
+# ------------------------------
+# 아주 큰 "전체 공개" 칸에서는 칸 전체를 점수 매기지 않고
+#   1) 프로필을 고정 길이 벡터 두 개로 바꾼다 (상대 벡터: 내 실제 + 내가 원하는 것, 나 벡터: 점수 가중치)
+#   2) 칸마다 k-means 로 묶어 둔 목록(IVF) 중 내 벡터와 내적이 큰 묶음 몇 개만 훑어서
+#   3) 상위 ANN_SHORTLIST 명만 score_candidates (calc_match_score 규칙) 로 다시 매긴다.
+# 나 벡터 · 상대 벡터 는 calc_match_score 항목을 그대로 옮긴 값이다 (키는 5cm 칸).
+# 상대 매너온도는 칸을 만들 때 값으로 들어간다 (별점이 바뀌어도 다시 매길 때 정확한 값으로 고쳐진다).
+# 걸러내는 조건(나이 범위, 원하는 성별, 블랙리스트)은 큰 음수로 들어간다.
+# 정확한 계산과 얼마나 같은지는 ann_recall() / python main.py --ann-recall 로 잰다.
+ANN_ENABLED = os.environ.get("SOULY_ANN", "") == "1"
+ANN_MIN_POOL = int(os.environ.get("SOULY_ANN_MIN_POOL", 10000))  # 이보다 작은 칸은 전부 정확히 계산
+ANN_SHORTLIST = int(os.environ.get("SOULY_ANN_SHORTLIST", 200))
+ANN_NPROBE = int(os.environ.get("SOULY_ANN_NPROBE", 64))  # 칸마다 sqrt(인원) 묶음 중 훑는 수
+ANN_KMEANS_ITERS = 8
+ANN_KMEANS_SAMPLE = 64  # 묶음 하나당 k-means 표본 수
+ANN_REBUILD_RATIO = 0.1  # 칸을 만든 뒤 바뀐 사람이 이 비율을 넘으면 다시 묶는다
+ANN_PENALTY = 30.0
+AGE_EDGES = np.arange(10, 102, 1)
+HEIGHT_EDGES = np.arange(130, 226, 5)
+
+
+def _onehot(vals, options):
+    return (vals[:, None] == np.array(options, dtype=object)[None, :]).astype(np.float32)
+
+
+def _bin_onehot(vals, edges):
+    out = np.zeros((len(vals), len(edges) - 1), dtype=np.float32)
+    idx = np.searchsorted(edges, vals, side="right") - 1
+    ok = np.isfinite(vals) & (idx >= 0) & (idx < out.shape[1])
+    out[np.flatnonzero(ok), idx[ok]] = 1
+    return out
+
+
+def _range_cover(lo, hi, edges):
+    # 정수 범위 [lo, hi] 가 칸마다 덮는 비율 (0~1)
+    left, right = edges[None, :-1], edges[None, 1:]
+    cover = (np.minimum(hi[:, None] + 1, right) - np.maximum(lo[:, None], left)) / (right - left)
+    return np.nan_to_num(np.clip(cover, 0, 1)).astype(np.float32)
+
+
+def _mask_bits(masks, width):
+    # 비트마스크 → 0/1 열 (보기에 없던 태그 비트는 버린다)
+    return ((masks[:, None] >> np.arange(width, dtype=np.uint64)) & np.uint64(1)).astype(np.float32)
+
+
+def profile_embeddings(df):
+    # (상대 벡터, 나 벡터) 두 행렬. 나 벡터[i] · 상대 벡터[j] ≈ calc_match_score(i, j)
+    f = _score_fields(_with_score_columns(df))
+    width = {family: len(options) for family, options in TAG_FAMILIES.items()}
+    self_p, pref_p, black_p = (_mask_bits(f[c], width["personality"]) for c in ("_self_p", "_pref_p", "_black_p"))
+    self_a, pref_a, black_a = (_mask_bits(f[c], width["appearance"]) for c in ("_self_a", "_pref_a", "_black_a"))
+    self_b, pref_b = (_mask_bits(f[c], width["body"]) for c in ("_self_b", "_pref_b"))
+    any_a = f["pref_a_any"][:, None].astype(np.float32)
+    any_b = f["pref_b_any"][:, None].astype(np.float32)
+    self_age = _bin_onehot(f["self_age"], AGE_EDGES)
+    pref_age = _range_cover(f["pref_min_age"], f["pref_max_age"], AGE_EDGES)
+    pref_height = _range_cover(f["pref_min_height"], f["pref_max_height"], HEIGHT_EDGES)
+
+    items = np.hstack([
+        self_age, _bin_onehot(f["self_height"], HEIGHT_EDGES), _onehot(f["gender"], GENDER_OPTIONS),
+        self_p, self_a, self_b,
+        pref_age, _onehot(f["pref_gender"], PREF_GENDER_OPTIONS),
+        pref_p, pref_a * (1 - any_a), any_a, pref_b * (1 - any_b), any_b,
+        _manner_array(f["user_id"])[:, None] / 50.0,
+    ]).astype(np.float32)
+
+    # ===== 내가 원하는 조건 vs 상대 실제 =====
+    any_gender = (f["pref_gender"] == "상관없음")[:, None]
+    want_gender = _onehot(f["pref_gender"], GENDER_OPTIONS)
+    # ===== 상대가 원하는 조건 vs 내 실제 (범위 밖 -5 는 모두에게 같으니 빼고 8 + 5) =====
+    pref_gender_options = np.array(PREF_GENDER_OPTIONS, dtype=object)[None, :]
+    their_gender = np.where(
+        pref_gender_options == "상관없음", 2, np.where(pref_gender_options == f["gender"][:, None], 5, -5)
+    )
+    ones = np.ones((len(any_a), 1), dtype=np.float32)
+    queries = np.hstack([
+        10 * pref_age - ANN_PENALTY * (1 - pref_age),
+        4 * pref_height,
+        np.where(any_gender, 3, 5 * want_gender - ANN_PENALTY * (1 - want_gender)),
+        3 * pref_p - ANN_PENALTY * black_p,
+        np.where(any_a > 0, 1, 3 * pref_a) - ANN_PENALTY * black_a,
+        np.where(any_b > 0, 1, 4 * pref_b - (1 - pref_b)),
+        13 * self_age,
+        their_gender,
+        2 * self_p,
+        2 * self_a, ones,
+        2 * self_b, ones,
+        ones,
+    ]).astype(np.float32)
+    return items, queries
+
+
+def _nearest(x, centroids, chunk=8192):
+    # 가장 가까운(L2) 중심 번호
+    half = 0.5 * (centroids * centroids).sum(axis=1)
+    out = np.empty(len(x), dtype=np.int64)
+    for start in range(0, len(x), chunk):
+        out[start:start + chunk] = np.argmax(x[start:start + chunk] @ centroids.T - half, axis=1)
+    return out
+
+
+def _kmeans(x, k, seed=0, iters=ANN_KMEANS_ITERS):
+    # 표본으로만 중심을 잡는다 (빈 묶음은 표본에서 다시 뽑음)
+    rng = np.random.default_rng(seed)
+    sample = x[rng.choice(len(x), min(len(x), k * ANN_KMEANS_SAMPLE), replace=False)]
+    centroids = sample[rng.choice(len(sample), k, replace=False)].copy()
+    for _ in range(iters):
+        assign = _nearest(sample, centroids)
+        members = np.zeros((k, len(sample)), dtype=np.float32)
+        members[assign, np.arange(len(sample))] = 1
+        counts = members.sum(axis=1)
+        empty = counts == 0
+        centroids[~empty] = (members[~empty] @ sample) / counts[~empty, None]
+        centroids[empty] = sample[rng.choice(len(sample), int(empty.sum()))]
+    return centroids
+
+
+class IvfPool:
+    # 칸 하나의 IVF: k-means 묶음별 행 위치, 묶음 평균(중심), 묶음 안 벡터의 칸별 최댓값/최솟값.
+    # 중심과의 내적이 큰 묶음부터 nprobe 개까지 훑는다. 최댓값/최솟값으로 구한 내적 상한이
+    # 남은 묶음 모두 지금 k 번째 내적보다 작으면 더 나올 게 없으니 일찍 멈춘다.
+    # alive 가 False 인 행은 프로필이 바뀌어 낡은 벡터.
+    def __init__(self, ids, items, seed=0):
+        self.ids = np.asarray(ids, dtype=object)
+        self.items = items
+        self.alive = np.ones(len(self.ids), dtype=bool)
+        self.positions = {user_id: i for i, user_id in enumerate(self.ids)}
+        n_lists = max(1, int(np.sqrt(len(self.ids))))
+        assign = _nearest(items, _kmeans(items, n_lists, seed))
+        _, assign = np.unique(assign, return_inverse=True)  # 빈 묶음은 뺀다
+        self.order = np.argsort(assign, kind="stable")
+        starts = np.flatnonzero(np.r_[True, np.diff(assign[self.order]) != 0])
+        self.offsets = np.r_[starts, len(assign)]
+        grouped = items[self.order]
+        self.centroids = np.add.reduceat(grouped, starts) / np.diff(self.offsets)[:, None]
+        self.upper = np.maximum.reduceat(grouped, starts)
+        self.lower = np.minimum.reduceat(grouped, starts)
+
+    def kill(self, user_id):
+        pos = self.positions.get(user_id)
+        if pos is not None:
+            self.alive[pos] = False
+
+    def search(self, query, nprobe, k):
+        # 내적 상위 k 개 (user_id, 내적)
+        probe = np.argsort(-(self.centroids @ query), kind="stable")[:nprobe]
+        bounds = self.upper[probe] @ np.maximum(query, 0) + self.lower[probe] @ np.minimum(query, 0)
+        best_left = np.maximum.accumulate(bounds[::-1])[::-1]
+        rows = np.empty(0, dtype=np.int64)
+        scores = np.empty(0, dtype=np.float32)
+        for c, bound in zip(probe, best_left):
+            if len(scores) >= k and bound < scores.min():
+                break
+            found = self.order[self.offsets[c]:self.offsets[c + 1]]
+            found = found[self.alive[found]]
+            rows = np.concatenate([rows, found])
+            scores = np.concatenate([scores, self.items[found] @ query])
+            if len(rows) > k:
+                top = np.argpartition(-scores, k)[:k]
+                rows, scores = rows[top], scores[top]
+        return self.ids[rows], scores
+
+
+class EmbeddingIndex:
+    # blocking_key 칸마다 "전체 공개" 사람들의 IvfPool. 칸은 처음 찾을 때 만든다.
+    # 프로필이 바뀐 사람은 원래 칸에서 빼고 새 벡터를 extra 에 두었다가 그대로 훑는다.
+    # 벡터를 만들 때 매너온도(TableCache)를 읽으므로 self.lock 을 잡은 채로는 캐시를 부르지 않는다.
+    # (캐시는 자기 잠금을 잡은 채 apply_upsert 를 부르므로 순서가 엇갈리면 서로 기다리다 멈춘다)
+    def __init__(self, profiles):
+        self.profiles = profiles
+        self.lock = threading.Lock()
+        self.pools = {}
+        self.extra = {}  # blocking_key → {user_id: 상대 벡터}
+        self.changed = set()  # profiles 를 읽은 뒤 바뀐 사람 (profiles 의 줄은 낡음)
+
+    def apply_upsert(self, row, old_row):
+        user_id = row["user_id"]
+        key = blocking_key(row)
+        item = None
+        if key is not None and _restricted_group(row) is None:
+            item = profile_embeddings(row.to_frame().T)[0][0]
+        with self.lock:
+            self.changed.add(user_id)
+            if old_row is not None:
+                old_key = blocking_key(old_row)
+                self.extra.get(old_key, {}).pop(user_id, None)
+                if old_key in self.pools:
+                    self.pools[old_key].kill(user_id)
+            if item is not None:
+                self.extra.setdefault(key, {})[user_id] = item
+
+    def _pool_rows(self, key):
+        # 칸을 처음 만들 때 쓸 (user_id, 상대 벡터). 캐시를 부르므로 self.lock 밖에서.
+        purpose, match_mode, size = key
+        df = self.profiles
+        mask = (df["purpose"] == purpose) & (df["match_mode"] == match_mode) & ~df["_restricted"]
+        if size is not None:
+            mask &= df["_gs"] == size
+        part = df[mask]
+        return part["user_id"].to_numpy(dtype=object), profile_embeddings(part)[0]
+
+    def _pool(self, key, rows=None):
+        # self.lock 을 잡고 부른다. 칸이 없으면 rows 로 만든다 (rows 가 없으면 None).
+        pool = self.pools.get(key)
+        extra = self.extra.get(key, {})
+        if pool is None:
+            if rows is None:
+                return None
+            # 벡터를 만드는 사이에 바뀐 사람까지 빼고 (새 벡터는 extra 에 있다)
+            ids, items = rows
+            keep = ~np.isin(ids, list(self.changed)) if self.changed else np.ones(len(ids), dtype=bool)
+            ids, items = ids[keep].tolist(), items[keep]
+        elif len(extra) > ANN_REBUILD_RATIO * len(pool.ids):
+            ids, items = pool.ids[pool.alive].tolist(), pool.items[pool.alive]
+        else:
+            return pool
+        if extra:
+            ids += list(extra)
+            items = np.vstack([items, np.stack(list(extra.values()))])
+        pool = self.pools[key] = IvfPool(ids, items)
+        self.extra[key] = {}
+        return pool
+
+    def _ready_pool(self, key):
+        with self.lock:
+            pool = self._pool(key)
+        if pool is None:
+            rows = self._pool_rows(key)
+            with self.lock:
+                pool = self._pool(key, rows)
+        return pool
+
+    def build(self, keys):
+        for key in keys:
+            self._ready_pool(key)
+
+    def search(self, me, k=ANN_SHORTLIST, nprobe=ANN_NPROBE):
+        # 내 칸의 "전체 공개" 사람 중 내적 상위 k 명의 user_id (나는 뺀다)
+        key = blocking_key(me)
+        if key is None:
+            return []
+        query = profile_embeddings(me.to_frame().T)[1][0]
+        self._ready_pool(key)
+        with self.lock:
+            pool = self._pool(key)
+            ids, scores = pool.search(query, nprobe, k + 1)
+            extra = self.extra.get(key, {})
+            if extra:
+                ids = np.concatenate([ids, np.array(list(extra), dtype=object)])
+                scores = np.concatenate([scores, np.stack(list(extra.values())) @ query])
+        order = np.argsort(-scores, kind="stable")
+        return [user_id for user_id in ids[order] if user_id != me["user_id"]][:k]
+
+
+def get_embedding_index():
+    return get_table_cache().derived("profiles", "embedding_index", EmbeddingIndex, get_storage())
+
+
+def ann_pool_size(me):
+    # 근사 검색을 쓰는 칸이면 그 칸의 "전체 공개" 인원, 아니면 0
+    if _restricted_group(me) is not None:
+        return 0
+    key = blocking_key(me)
+    bucket = get_candidate_index().buckets.get(key) if key is not None else None
+    return 0 if bucket is None else len(bucket["open"])
+
+
+@timed("ann_match_scores")
+def ann_match_scores(me, shortlist=ANN_SHORTLIST, nprobe=ANN_NPROBE):
+    # 근사 검색으로 고른 후보 + 같은 그룹 이름의 "특정 그룹" 사람들만 정확한 점수로 다시 매긴다
+    ids = get_embedding_index().search(me, shortlist, nprobe)
+    if isinstance(me["group_name"], str):
+        bucket = get_candidate_index().buckets.get(blocking_key(me), {})
+        ids += sorted(bucket.get("restricted", {}).get(me["group_name"], ()))
+    index = get_profile_index()
+    positions = [index.positions[u] for u in ids if u in index.positions]
+    return live_match_scores(me, index.df.iloc[positions])
+
+
+def ann_recall(sample=50, k=20, seed=0, shortlist=ANN_SHORTLIST, nprobe=ANN_NPROBE):
+    # 큰 칸에서 sample 명을 골라 근사 상위 k 와 정확한 상위 k 를 비교한다.
+    # recall = 근사 목록 중 정확한 k 번째 점수 이상인 후보 수 / 정확한 목록 길이 (동점은 맞은 것으로 센다)
+    df = load_data()
+    index = get_candidate_index()
+    keys = [key for key, bucket in index.buckets.items() if len(bucket["open"]) >= ANN_MIN_POOL]
+    users = sorted(u for key in keys for u in index.buckets[key]["open"])
+    users = random.Random(seed).sample(users, min(sample, len(users)))
+    started = time.perf_counter()
+    get_embedding_index().build(keys)
+    build_s = time.perf_counter() - started
+    hits = total = 0
+    exact_s, ann_s = [], []
+    for user_id in users:
+        me = get_profile(user_id)
+        started = time.perf_counter()
+        exact = top_k_matches(live_match_scores(me, df[df["user_id"].isin(index.candidates_for(me))]), k)
+        exact_s.append(time.perf_counter() - started)
+        started = time.perf_counter()
+        approx = top_k_matches(ann_match_scores(me, shortlist, nprobe), k)
+        ann_s.append(time.perf_counter() - started)
+        if exact:
+            hits += sum(score >= exact[-1][1] for _, score in approx)
+            total += len(exact)
+    return {
+        "pools": len(keys),
+        "pool_users": sum(len(index.buckets[key]["open"]) for key in keys),
+        "users": len(users),
+        "k": k,
+        "shortlist": shortlist,
+        "nprobe": nprobe,
+        "recall": float(hits / total) if total else 1.0,
+        "build_s": build_s,
+        "exact_median_s": float(np.median(exact_s)) if exact_s else 0.0,
+        "ann_median_s": float(np.median(ann_s)) if ann_s else 0.0,
+    }
+
+
+# ------------------------------
+# 전체 매칭 배치 (python main.py --batch-score)
+# ------------------------------
+BATCH_TOP_K = 50
+
+_BATCH_PROFILES = None
+
+
+def _init_batch_worker(profiles):
+    global _BATCH_PROFILES
+    _BATCH_PROFILES = profiles
+
+
+def _batch_score_chunk(task):
+    me_ids, member_ids, top_k = task
+    part = _BATCH_PROFILES[_BATCH_PROFILES["user_id"].isin(member_ids)]
+    rows = []
+    positions = dict(zip(part["user_id"], range(len(part))))
+    for user_id in me_ids:
+        me = part.iloc[positions[user_id]]
+        top = top_k_matches(live_match_scores(me, part[part["user_id"] != user_id]), top_k)
+        rows.append((user_id, 0, user_id, float(top_k)))
+        for rank, (candidate_id, score) in enumerate(top, start=1):
+            rows.append((user_id, rank, candidate_id, score))
+    return rows
+
+
+def run_batch_scoring(top_k=BATCH_TOP_K, workers=None):
+    # 모든 프로필의 후보 상위 top_k 를 블로킹 칸 단위로 나눠 여러 프로세스에서 계산
+    computed_at = datetime.now().isoformat()
+    profiles = _prepare_table("profiles", load_profile_columns())
+    workers = workers or os.cpu_count() or 1
+
+    partitions = CandidateIndex(profiles).partitions()
+    tasks = []
+    for members in partitions.values():
+        chunk = max(1, len(members) // (workers * 4) + 1)
+        for i in range(0, len(members), chunk):
+            tasks.append((members[i:i + chunk], members, top_k))
+
+    rows = []
+    if workers == 1:
+        _init_batch_worker(profiles)
+        for task in tasks:
+            rows.extend(_batch_score_chunk(task))
+    else:
+        with ProcessPoolExecutor(
+            max_workers=workers, initializer=_init_batch_worker, initargs=(profiles,)
+        ) as pool:
+            for chunk_rows in pool.map(_batch_score_chunk, tasks):
+                rows.extend(chunk_rows)
+
+    topk = pd.DataFrame(rows, columns=["user_id", "rank", "candidate_id", "score"])
+    topk["computed_at"] = computed_at
+    _save_table("match_topk", topk)
+    return {"users": len(profiles), "partitions": len(partitions), "rows": int((topk["rank"] > 0).sum())}
+
+
+def _merge_candidate(rest, new_pair, full, top_k):
+    # rest: X 를 뺀 기존 목록 (순위순), new_pair: X 의 새 점수. 확실하지 않으면 None.
+    merged = sorted(rest + [new_pair], key=_rank_key)
+    if not full:
+        return merged
+    if len(rest) < top_k:
+        # 원래 X 가 들어 있던 꽉 찬 목록: X 가 남은 것 중 꼴찌보다 앞이어야 빈자리가 없다
+        if not rest or _rank_key(new_pair) < _rank_key(rest[-1]):
+            return merged
+        return None
+    return merged[:top_k]
+
+
+def refresh_candidate_lists(user_id):
+    # 프로필 하나(X)가 바뀌었을 때 match_topk 에서 X 가 걸린 목록만 고친다.
+    #   - X 자신의 목록: 새 칸에서 다시 계산하고 기준 시각을 지금으로
+    #   - 다른 사람 목록: X 를 빼고, 새 점수가 상위 K 에 들면 끼워 넣는다 (기준 시각은 그대로)
+    #   - 꽉 찬 목록에서 X 가 빠져 K 번째를 모르게 되면 그 사람 목록은 버린다
+    #     (기준 시각만 남기고, 다음에 볼 때 실시간으로 계산)
+    # 읽은 뒤 다른 세션이 match_topk 를 먼저 고쳤으면 새로 읽어서 다시 계산한다.
+    return _retry_stale("match_topk", lambda: _refresh_candidate_lists(user_id))
+
+
+def _refresh_candidate_lists(user_id):
+    store, stamp = get_table_cache().get_versioned("match_topk", get_storage())
+    profiles = load_data()
+    me = get_profile(user_id)
+    if store.empty or me is None:
+        return {"patched": 0, "dropped": 0}
+    batch = get_batch_results()
+    top_k = batch.top_k
+
+    candidate_ids = get_candidate_index().candidates_for(me)
+    others = profiles[profiles["user_id"].isin(candidate_ids) & (profiles["user_id"] != user_id)]
+    lists = {user_id: (datetime.now().isoformat(), top_k_matches(live_match_scores(me, others), top_k))}
+    reverse = {}
+    if not others.empty:
+        scores = np.broadcast_to(score_pairs(others, me.to_frame().T), len(others))
+        positive = scores > 0
+        reverse = dict(zip(others["user_id"].to_numpy()[positive], scores[positive]))
+
+    holders = set(store.loc[(store["candidate_id"] == user_id) & (store["rank"] > 0), "user_id"])
+    dropped = []
+    for uid in (holders | set(reverse)) - {user_id}:
+        if uid not in batch.synced_at or uid in batch.stale:
+            continue
+        current = batch.current(uid)
+        rest = [pair for pair in current if pair[0] != user_id]
+        full = len(current) >= top_k
+        if uid in reverse:
+            new_pair = (user_id, float(reverse[uid]))
+            if uid not in holders and full and _rank_key(new_pair) >= _rank_key(rest[-1]):
+                continue
+            merged = _merge_candidate(rest, new_pair, full, top_k)
+        else:
+            merged = None if full else rest
+        if merged is None:
+            dropped.append(uid)
+        else:
+            lists[uid] = (batch.synced_at[uid], merged)
+
+    rows = [
+        {"user_id": uid, "rank": 0, "candidate_id": uid, "score": -float(top_k), "computed_at": batch.synced_at[uid]}
+        for uid in dropped
+    ]
+    for uid, (synced_at, pairs) in lists.items():
+        rows.append({"user_id": uid, "rank": 0, "candidate_id": uid, "score": float(top_k), "computed_at": synced_at})
+        for rank, (candidate_id, score) in enumerate(pairs, start=1):
+            rows.append(
+                {"user_id": uid, "rank": rank, "candidate_id": candidate_id, "score": float(score), "computed_at": synced_at}
+            )
+    _patch_table("match_topk", {"user_id": list(lists) + dropped}, rows, expected=stamp)
+    return {"patched": len(lists), "dropped": len(dropped)}
+
+
+def _int_arg(name, default):
+    if name in sys.argv:
+        i = sys.argv.index(name)
+        if i + 1 < len(sys.argv):
+            return int(sys.argv[i + 1])
+    return default
+
+
+# ------------------------------
+# 팀 매칭 (팀 ↔ 팀)
+# ------------------------------
+# 팀 점수 = 두 팀 팀원끼리 모든 쌍(양방향) 점수의 평균 또는 최저값.
+# 제외 조건에 걸린 쌍은 0점으로 센다. 그래서 '최저'는 모든 쌍이 조건을 만족할 때만 0보다 크다.
+TEAM_AGGREGATES = {"평균": "mean", "최저 (모든 팀원이 조건을 만족할 때만)": "min"}
+TEAM_SCORE_CELLS = 1 << 20  # 한 번에 점수표로 만드는 팀원 쌍 수 상한
+
+
+class TeamTable:
+    # 팀 코드 → 팀원. 선언한 인원 수(group_size)만큼 모인 팀만 ready.
+    def __init__(self, df):
+        self.members = {}
+        self.sizes = {}
+        self.keys = {}
+        teams = df[df["_is_team"] & (df["_team"] != "")]
+        for code, group in teams.groupby("_team", sort=False):
+            self.members[code] = group["user_id"].tolist()
+            sizes = group["_gs"].dropna().unique()
+            purposes = group["purpose"].dropna().unique()
+            if len(sizes) != 1 or len(purposes) != 1:
+                continue
+            self.sizes[code] = int(sizes[0])
+            if len(group) == self.sizes[code]:
+                self.keys[code] = (purposes[0], self.sizes[code])
+
+    def is_ready(self, code):
+        return code in self.keys
+
+    def rivals(self, code):
+        key = self.keys.get(code)
+        return [c for c, k in self.keys.items() if k == key and c != code]
+
+
+def get_team_table():
+    return get_table_cache().derived("profiles", "team_table", TeamTable, get_storage())
+
+
+def _rows_in_order(df, user_ids):
+    return df.iloc[pd.Index(df["user_id"]).get_indexer(user_ids)]
+
+
+@timed("team_match_scores")
+def team_match_scores(team_code, df, how="mean"):
+    # (상대 팀 코드, 팀 점수) 목록. 상대 팀 여러 개를 한 점수표로 묶어서 계산한다.
+    teams = get_team_table()
+    if not teams.is_ready(team_code):
+        return []
+    mine = _rows_in_order(df, teams.members[team_code])
+    size = len(mine)
+    rivals = teams.rivals(team_code)
+    chunk = max(1, TEAM_SCORE_CELLS // (2 * size * size))
+    results = []
+    for i in range(0, len(rivals), chunk):
+        codes = rivals[i:i + chunk]
+        others = _rows_in_order(df, [u for c in codes for u in teams.members[c]])
+        forward = score_matrix(mine, others).reshape(size, len(codes), size).transpose(1, 0, 2)
+        backward = score_matrix(others, mine).reshape(len(codes), size, size)
+        cells = np.concatenate(
+            [forward.reshape(len(codes), -1), backward.reshape(len(codes), -1)], axis=1
+        ).clip(min=0)
+        agg = cells.min(axis=1) if how == "min" else cells.mean(axis=1)
+        results.extend((c, float(v)) for c, v in zip(codes, agg) if v > 0)
+    return results
+
+
+# ------------------------------
+# 다인원 그룹 만들기 (python main.py --form-groups)
+# ------------------------------
+# (목적, 인원 수, 그룹) 칸마다 사람들을 인원 수만큼씩 묶는다.
+# 그룹 안 모든 쌍이 양방향으로 점수 > 0 이어야 하고, 쌍 점수 합이 크도록
+# 욕심쟁이로 먼저 묶은 뒤 시간 예산 안에서 두 그룹끼리 한 명씩 맞바꿔 본다.
+GROUP_TIME_BUDGET = 5  # 초 (모든 칸 합)
+GROUP_NEIGHBORS = 30  # 시드로 묶을 때 사람마다 먼저 보는 이웃 수
+GROUP_SAMPLE = 300  # 이웃을 찾을 때 사람마다 살펴보는 상대 수
+GROUP_BLOCKED = -1e9  # 같은 그룹이 될 수 없는 쌍
+
+
+class GroupSolver:
+    def __init__(self, part, size, seed=0):
+        self.ids = part["user_id"].to_numpy(dtype=object)
+        self.fields = _score_fields(_with_score_columns(part))
+        self.manner = _manner_array(self.fields["user_id"])
+        self.size = size
+        self.rng = np.random.default_rng(seed)
+
+    def weights(self, i, j):
+        # 쌍 (i[k], j[k]) 의 양방향 점수 합. 한쪽이라도 0 이하면 GROUP_BLOCKED.
+        a = {key: val[i] for key, val in self.fields.items()}
+        b = {key: val[j] for key, val in self.fields.items()}
+        forward = _pair_scores(a, b, self.manner[i], self.manner[j])
+        backward = _pair_scores(b, a, self.manner[j], self.manner[i])
+        return np.where((forward > 0) & (backward > 0), forward + backward, GROUP_BLOCKED)
+
+    def block(self, rows, cols):
+        # rows × cols 가중치 표 (같은 사람끼리는 0)
+        i, j = np.meshgrid(rows, cols, indexing="ij")
+        w = self.weights(i.ravel(), j.ravel()).reshape(len(rows), len(cols))
+        return np.where(i == j, 0.0, w)
+
+    def _neighbors(self, deadline):
+        # 사람마다 무작위 GROUP_SAMPLE 명 중 같이 묶일 수 있는 상위 GROUP_NEIGHBORS 명
+        # (시간이 다 되면 남은 사람은 이웃 없이 — 이번에는 그룹에 못 들어간다)
+        n = len(self.ids)
+        neighbors = []
+        for start in range(0, n, 256):
+            if time.perf_counter() >= deadline:
+                neighbors.extend([] for _ in range(n - start))
+                break
+            rows = np.arange(start, min(n, start + 256))
+            if n - 1 <= GROUP_SAMPLE:
+                cols = np.tile(np.arange(n), (len(rows), 1))
+            else:
+                cols = self.rng.integers(0, n, size=(len(rows), GROUP_SAMPLE))
+            w = self.weights(np.repeat(rows, cols.shape[1]), cols.ravel()).reshape(cols.shape)
+            w[cols == rows[:, None]] = GROUP_BLOCKED
+            order = np.argsort(-w, axis=1, kind="stable")[:, :GROUP_NEIGHBORS]
+            for r in range(len(rows)):
+                good = order[r][w[r, order[r]] > 0]
+                neighbors.append(list(dict.fromkeys(cols[r, good].tolist())))
+        return neighbors
+
+    def _grow(self, seed, pool, free):
+        members = [seed]
+        fallback = False
+        while len(members) < self.size:
+            pool = [c for c in pool if free[c] and c not in members]
+            if not pool and not fallback:
+                # 이웃이 바닥나면 남은 사람 중 무작위로 한 번 더 찾아본다
+                fallback = True
+                rest = np.flatnonzero(free)
+                rest = rest[~np.isin(rest, members)]
+                pool = self.rng.choice(rest, size=min(len(rest), GROUP_SAMPLE), replace=False).tolist()
+            if not pool:
+                return None
+            totals = self.block(np.array(pool), np.array(members)).sum(axis=1)
+            best = int(np.argmax(totals))
+            if totals[best] <= 0:
+                if fallback:
+                    return None
+                pool = []
+                continue
+            members.append(pool[best])
+        return members
+
+    def _seed(self, neighbors, deadline):
+        # 같이 묶일 사람이 적은 사람부터 그룹을 시작한다 (시간이 다 되면 거기까지)
+        free = np.ones(len(self.ids), dtype=bool)
+        groups = []
+        for u in sorted(range(len(self.ids)), key=lambda u: len(neighbors[u])):
+            if time.perf_counter() >= deadline:
+                break
+            if not free[u] or not neighbors[u]:
+                continue
+            members = self._grow(u, neighbors[u], free)
+            if members is not None:
+                free[members] = False
+                groups.append(np.array(members))
+        return groups, free
+
+    def _improve(self, groups, free, deadline):
+        # 그룹 둘(또는 그룹과 남은 사람)을 골라 가장 좋은 한 명 맞바꾸기를 해 본다
+        stale = 0
+        while groups and time.perf_counter() < deadline and stale < 50 * len(groups):
+            stale += 1
+            a = self.rng.integers(len(groups))
+            A = groups[a]
+            row_a = self.block(A, A).sum(axis=1)
+            leftovers = np.flatnonzero(free)
+            if len(groups) > 1 and (not len(leftovers) or self.rng.random() < 0.8):
+                b = self.rng.integers(len(groups) - 1)
+                B = groups[b + (b >= a)]
+                row_b = self.block(B, B).sum(axis=1)
+                X = self.block(A, B)
+                delta = (X.sum(axis=0)[None, :] - X - row_a[:, None]) + (X.sum(axis=1)[:, None] - X - row_b[None, :])
+                p, q = np.unravel_index(np.argmax(delta), delta.shape)
+                if delta[p, q] > 1e-3:
+                    A[p], B[q] = B[q], A[p]
+                    stale = 0
+            elif len(leftovers):
+                L = self.rng.choice(leftovers, size=min(len(leftovers), 64), replace=False)
+                X = self.block(A, L)
+                delta = X.sum(axis=0)[None, :] - X - row_a[:, None]
+                p, x = np.unravel_index(np.argmax(delta), delta.shape)
+                if delta[p, x] > 1e-3:
+                    free[A[p]] = True
+                    free[L[x]] = False
+                    A[p] = L[x]
+                    stale = 0
+        return groups
+
+    def solve(self, budget):
+        # [(user_id 목록, 그룹 안 쌍 점수 평균)]
+        deadline = time.perf_counter() + budget
+        groups, free = self._seed(self._neighbors(deadline), deadline)
+        groups = self._improve(groups, free, deadline)
+        pairs = self.size * (self.size - 1)
+        return [(self.ids[g].tolist(), float(self.block(g, g).sum() / 2 / pairs)) for g in groups]
+
+
+def group_partitions(profiles):
+    # 다인원 매칭 프로필을 (목적, 인원 수, 그룹) 칸으로 나눈다. 그룹 제한이 없으면 그룹은 "".
+    multi = profiles[(profiles["match_mode"] == "다인원 매칭") & (profiles["_gs"] >= 2)]
+    group = multi["group_name"].astype(object).where(multi["_restricted"], "")
+    keys = [multi["purpose"].astype(object), multi["_gs"], group]
+    return [(key, part) for key, part in multi.groupby(keys, sort=False) if len(part) >= int(key[1])]
+
+
+def form_groups(time_budget=GROUP_TIME_BUDGET, seed=0):
+    computed_at = datetime.now().isoformat()
+    partitions = group_partitions(load_data())
+    total = sum(len(part) for _, part in partitions) or 1
+    rows = []
+    n_groups = 0
+    for (_, size, _), part in partitions:
+        solver = GroupSolver(part, int(size), seed)
+        for members, score in solver.solve(time_budget * len(part) / total):
+            n_groups += 1
+            rows.extend((user_id, f"grp{n_groups:05d}", score) for user_id in members)
+    assignments = pd.DataFrame(rows, columns=["user_id", "group_id", "score"])
+    assignments["computed_at"] = computed_at
+    _save_table("groups", assignments)
+    return {"partitions": len(partitions), "groups": n_groups, "assigned": len(assignments), "users": total}
+
+
+class GroupAssignments:
+    def __init__(self, df):
+        self.group_of = dict(zip(df["user_id"], df["group_id"]))
+        self.members = {gid: part["user_id"].tolist() for gid, part in df.groupby("group_id", sort=False)}
+        self.scores = dict(zip(df["group_id"], df["score"]))
+
+
+def get_group_assignments():
+    return get_table_cache().derived("groups", "group_assignments", GroupAssignments, get_storage())
+
+
+# ------------------------------
+# 오늘의 추천 (1:1 전체 배정, python main.py --assign-pairs)
+# ------------------------------
+# 1:1 매칭을 (목적, 그룹) 칸 단위로 한 명이 한 명에게만 추천되도록 짝짓는다.
+# 간선은 각자의 후보 상위 목록(배치 결과, 없으면 실시간)에서만 만든 희소 그래프이고,
+# 가중치는 양방향 점수 합 (둘 다 0보다 커야 간선). 가중치 큰 간선부터 욕심쟁이로 고르면
+# 같은 가중치를 서로 선호로 보는 안정 매칭이 되고, 최대 가중치의 절반 이상이 보장된다.
+def pair_partitions(profiles):
+    single = profiles[profiles["match_mode"] == "1:1 매칭"]
+    group = single["group_name"].astype(object).where(single["_restricted"], "")
+    return single.groupby([single["purpose"].astype(object), group], sort=False)
+
+
+PAIR_SCORE_CELLS = 1 << 22  # 배치 목록이 없는 사람들 점수표를 한 번에 만드는 칸 수 상한
+
+
+def _candidate_edges(part, top_k):
+    # 칸 안에서 (i, j) 위치 쌍. 각자 후보 상위 top_k 명만 본다.
+    # 배치 목록이 없는 사람은 칸 전체와의 점수표(score_matrix)에서 양수 상위 top_k 명.
+    batch = get_batch_results()
+    positions = pd.Index(part["user_id"])
+    left, right = [], []
+    missing = []
+    for i, me in enumerate(part.to_dict("records")):
+        cached = batch.lookup(me)
+        if cached is None:
+            missing.append(i)
+            continue
+        found = positions.get_indexer(cached.index)
+        found = found[found >= 0]
+        left.extend([i] * len(found))
+        right.extend(found.tolist())
+    k = min(top_k, len(part) - 1)
+    chunk = max(1, PAIR_SCORE_CELLS // max(1, len(part)))
+    for start in range(0, len(missing) if k > 0 else 0, chunk):
+        rows = np.array(missing[start:start + chunk])
+        scores = score_matrix(part.iloc[rows], part)
+        scores[np.arange(len(rows)), rows] = -1.0  # 나 자신
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        keep = np.take_along_axis(scores, top, axis=1) > 0
+        left.extend(np.broadcast_to(rows[:, None], top.shape)[keep].tolist())
+        right.extend(top[keep].tolist())
+    if not left:
+        return np.empty(0, dtype=int), np.empty(0, dtype=int)
+    # 양쪽 목록에 모두 있는 쌍은 한 번만
+    a = np.minimum(left, right)
+    b = np.maximum(left, right)
+    keys = np.unique(a.astype(np.int64) * len(part) + b)
+    return keys // len(part), keys % len(part)
+
+
+def assign_pairs(part, top_k=BATCH_TOP_K):
+    # [(user_id, partner_id, 서로 점수 평균)] — 각 사람은 최대 한 번
+    i, j = _candidate_edges(part, top_k)
+    if len(i) == 0:
+        return []
+    left = part.iloc[i]
+    right = part.iloc[j]
+    forward = np.broadcast_to(score_pairs(left, right), len(i))
+    backward = np.broadcast_to(score_pairs(right, left), len(i))
+    ok = (forward > 0) & (backward > 0) & (i != j)
+    weight = (forward + backward)[ok]
+    i, j = i[ok], j[ok]
+    ids = part["user_id"].to_numpy(dtype=object)
+    taken = np.zeros(len(part), dtype=bool)
+    pairs = []
+    for k in np.lexsort((j, i, -weight)):
+        a, b = i[k], j[k]
+        if taken[a] or taken[b]:
+            continue
+        taken[a] = taken[b] = True
+        pairs.append((ids[a], ids[b], float(weight[k]) / 2))
+    return pairs
+
+
+def run_daily_picks(top_k=BATCH_TOP_K):
+    computed_at = datetime.now().isoformat()
+    df = load_data()
+    rows = []
+    n_partitions = 0
+    for _, part in pair_partitions(df):
+        n_partitions += 1
+        for a, b, score in assign_pairs(part, top_k):
+            rows.append((a, b, score))
+            rows.append((b, a, score))
+    picks = pd.DataFrame(rows, columns=["user_id", "partner_id", "score"])
+    picks["computed_at"] = computed_at
+    _save_table("daily_picks", picks)
+    return {"partitions": n_partitions, "pairs": len(rows) // 2}
+
+
+class DailyPicks:
+    def __init__(self, df):
+        self.picks = dict(zip(df["user_id"], zip(df["partner_id"], df["score"])))
+
+
+def get_daily_picks():
+    return get_table_cache().derived("daily_picks", "daily_picks", DailyPicks, get_storage())
+
+
+# ------------------------------
+# 서로 ♥ (최종 매칭) 그래프
+# ------------------------------
+class MatchGraph:
+    # "수락" 결정을 (from_user, to_user) 간선 집합으로 들고,
+    # 유저별 최종 매칭 / 나만 받은 ♥ 목록을 미리 만들어 둔다.
+    def __init__(self, decisions):
+        self.edges = set()
+        self.mutual = {}
+        self.liked_only = {}
+        accepts = decisions[decisions["decision"] == "수락"]
+        for a, b in zip(accepts["from_user"], accepts["to_user"]):
+            self._add(a, b)
+
+    def _add(self, a, b):
+        if (a, b) in self.edges:
+            return
+        self.edges.add((a, b))
+        if (b, a) in self.edges:
+            self.mutual.setdefault(a, set()).add(b)
+            self.mutual.setdefault(b, set()).add(a)
+            self.liked_only.setdefault(a, set()).discard(b)
+        else:
+            self.liked_only.setdefault(b, set()).add(a)
+
+    def _remove(self, a, b):
+        if (a, b) not in self.edges:
+            return
+        self.edges.discard((a, b))
+        if a == b:
+            self.mutual[a].discard(a)
+        elif (b, a) in self.edges:
+            self.mutual[a].discard(b)
+            self.mutual[b].discard(a)
+            self.liked_only.setdefault(a, set()).add(b)
+        else:
+            self.liked_only[b].discard(a)
+
+    def apply_upsert(self, row, old_row):
+        a, b = row["from_user"], row["to_user"]
+        if old_row is not None and old_row["decision"] == "수락":
+            self._remove(a, b)
+        if row["decision"] == "수락":
+            self._add(a, b)
+
+    # 다른 세션의 apply_upsert 가 안쪽 집합을 고치므로 복사본을 돌려준다
+    def mutual_matches(self, user_id):
+        return frozenset(self.mutual.get(user_id, ()))
+
+    def liked_me_only(self, user_id):
+        return frozenset(self.liked_only.get(user_id, ()))
+
+
+def get_match_graph():
+    return get_table_cache().derived("decisions", "match_graph", MatchGraph, get_storage())
+
+
+class PairIndex:
+    # (from_user, to_user) → 값 을 from_user 별 dict 로 들고 있다. 내가 보낸 결정/별점을 한 번에 조회.
+    def __init__(self, df, column):
+        self.column = column
+        self.outgoing = {}
+        for a, b, val in zip(df["from_user"], df["to_user"], df[column]):
+            self.outgoing.setdefault(a, {})[b] = val
+
+    def get(self, from_user, to_user, default=None):
+        return self.outgoing.get(from_user, {}).get(to_user, default)
+
+    def sent_by(self, from_user):
+        return dict(self.outgoing.get(from_user, {}))
+
+    def apply_upsert(self, row, old_row):
+        self.outgoing.setdefault(row["from_user"], {})[row["to_user"]] = row[self.column]
+
+
+def get_decision_index():
+    return get_table_cache().derived(
+        "decisions", "decision_index", lambda df: PairIndex(df, "decision"), get_storage()
+    )
+
+
+def get_rating_index():
+    return get_table_cache().derived(
+        "ratings", "rating_index", lambda df: PairIndex(df, "rating"), get_storage()
+    )
+
+
+# ------------------------------
+# 매칭 서비스 (Streamlit 화면과 api.py 가 같이 쓰는 함수)
+# ------------------------------
+# 화면은 get_service() 만 부른다. SOULY_API_URL 이 있으면 HTTP 로 api.py 서버에,
+# 없으면 같은 프로세스에서 아래 service_* 함수를 바로 부른다. 반환값은 JSON 으로 옮길 수 있는 dict/list.
+API_URL = os.environ.get("SOULY_API_URL", "").rstrip("/")
+API_TIMEOUT = float(os.environ.get("SOULY_API_TIMEOUT", 10))
+MATCH_LIST_MAX = 50  # 한 번 계산해서 세션에 들고 있는 후보 수 (페이지로 나눠 보여 줌)
+DECISION_OPTIONS = ("수락", "거절")
+CARD_COLUMNS = ["user_id", "self_age", "self_gender", "self_personality"]
+
+
+class UnknownUser(LookupError):
+    # 프로필이 없는 user_id (API 404). 그 밖의 KeyError 는 코드 오류로 보고 그대로 올린다.
+    pass
+
+
+def data_version(*tables):
+    # 저장소 stamp 묶음. 표가 하나라도 바뀌면 달라진다.
+    storage = get_storage()
+    return tuple(storage.stamp(table) for table in tables)
+
+
+def _json_value(val):
+    # NaN → None, numpy 값 → 파이썬 값
+    return _sql_value(val)
+
+
+def _profile_dict(row, columns=PROFILE_COLUMNS):
+    return {col: _json_value(row.get(col)) for col in columns}
+
+
+def service_version():
+    tables = ("profiles", "ratings", "match_topk", "groups", "daily_picks")
+    return {"version": repr(data_version(*tables)), "profiles": len(get_profile_index().positions)}
+
+
+def service_profile(user_id):
+    row = get_profile(user_id)
+    return None if row is None else _profile_dict(row)
+
+
+def _check_tags(row):
+    # 보기에 없는 태그는 받지 않는다 (새 태그마다 TagVocab 비트를 하나씩 쓴다)
+    for _, col, family, multi in MASK_COLUMNS:
+        val = row.get(col)
+        tags = split_tags(val) if multi else [val] if isinstance(val, str) and val else []
+        unknown = [tag for tag in tags if tag not in TAG_FAMILIES[family]]
+        if unknown:
+            raise ValueError(f"{col}: 보기에 없는 값 {', '.join(map(str, unknown[:5]))}")
+
+
+# 설문 화면과 같은 범위 / 보기만 받는다
+PROFILE_INT_RANGES = {
+    "group_size": (2, 5),
+    "self_age": (10, 100),
+    "self_height": (130, 220),
+    "pref_min_age": (10, 100),
+    "pref_max_age": (10, 100),
+    "pref_min_height": (130, 220),
+    "pref_max_height": (130, 220),
+}
+PROFILE_OPTIONS = {
+    "purpose": PURPOSE_OPTIONS,
+    "match_mode": MATCH_MODE_OPTIONS,
+    "group_scope": GROUP_SCOPE_OPTIONS,
+    "self_gender": GENDER_OPTIONS,
+    "pref_gender": PREF_GENDER_OPTIONS,
+}
+
+
+def _check_profile(row):
+    # 잘못된 값이면 ValueError (API 400). 정수 컬럼은 int 로 바꾼 줄을 돌려준다.
+    row = {col: "" if row.get(col) is None else row.get(col) for col in PROFILE_COLUMNS}
+    for col, val in row.items():
+        if col in PROFILE_INT_RANGES:
+            if isinstance(val, float) and val.is_integer():
+                val = int(val)
+            lo, hi = PROFILE_INT_RANGES[col]
+            if isinstance(val, bool) or not isinstance(val, int) or not lo <= val <= hi:
+                raise ValueError(f"{col} 은 {lo}~{hi} 사이 정수여야 합니다")
+            row[col] = val
+        elif not isinstance(val, str):
+            raise ValueError(f"{col} 은 문자열이어야 합니다")
+        elif col in PROFILE_OPTIONS and val not in PROFILE_OPTIONS[col]:
+            raise ValueError(f"{col}: 보기에 없는 값 {val}")
+    if row["pref_min_age"] > row["pref_max_age"] or row["pref_min_height"] > row["pref_max_height"]:
+        raise ValueError("원하는 나이/키 범위의 최솟값이 최댓값보다 큽니다")
+    _check_tags(row)
+    return row
+
+
+def service_save_profile(row):
+    if not str(row.get("user_id") or "").strip():
+        raise ValueError("user_id 가 필요합니다")
+    row = _check_profile(row)
+    row["timestamp"] = row["timestamp"] or datetime.now().isoformat()
+    upsert_profile(row)
+    return {"ok": True}
+
+
+def _team_listing(me, df, limit, how):
+    teams = get_team_table()
+    code = me["_team"]
+    out = {
+        "kind": "teams",
+        "members": teams.members.get(code, []),
+        "size": teams.sizes.get(code),
+        "ready": teams.is_ready(code),
+        "candidates": [],
+    }
+    if not out["ready"]:
+        return out
+    with timed_block("match_page.team_rank"):
+        top = top_k_matches(team_match_scores(code, df, how), limit)
+    manner = get_manner_table()
+    for rival, score in top:
+        rows = _rows_in_order(df, teams.members[rival])
+        people = [dict(_profile_dict(row, CARD_COLUMNS), manner=manner.get(row["user_id"])) for _, row in rows.iterrows()]
+        out["candidates"].append({"members": teams.members[rival], "score": score, "people": people})
+    return out
+
+
+def service_match_list(user_id, limit=MATCH_LIST_MAX, how="mean"):
+    # 후보 순위 (팀 매칭이면 팀 순위). 결정(♥/패스)은 자주 바뀌므로 service_decisions 로 따로.
+    me = get_profile(user_id)
+    if me is None:
+        raise UnknownUser(user_id)
+    df = load_data()
+    if me["_is_team"] and me["_team"]:
+        return _team_listing(me, df, limit, how)
+
+    with timed_block("match_page.rank") as timer:
+        top = top_k_matches(timer.count(iter_match_scores(me, df)), limit)
+    temps = get_manner_table().temperatures(pd.Series([u for u, _ in top], dtype=object)).tolist()
+    out = {
+        "kind": "people",
+        "candidates": [{"user_id": u, "score": float(s), "manner": t} for (u, s), t in zip(top, temps)],
+    }
+    if me["match_mode"] == "다인원 매칭":
+        groups = get_group_assignments()
+        group_id = groups.group_of.get(user_id)
+        if group_id is not None:
+            out["group"] = {"members": groups.members[group_id], "score": float(groups.scores[group_id])}
+    elif me["match_mode"] == "1:1 매칭":
+        pick = get_daily_picks().picks.get(user_id)
+        if pick is not None:
+            out["daily_pick"] = {"user_id": pick[0], "score": float(pick[1])}
+    return out
+
+
+def service_decisions(user_id):
+    return get_decision_index().sent_by(user_id)
+
+
+def service_decide(row):
+    if row.get("decision") not in DECISION_OPTIONS:
+        raise ValueError("decision 은 '수락' 또는 '거절' 이어야 합니다")
+    if not row.get("from_user") or not row.get("to_user"):
+        raise ValueError("from_user, to_user 가 필요합니다")
+    upsert_decision({
+        "timestamp": row.get("timestamp") or datetime.now().isoformat(),
+        "from_user": row["from_user"],
+        "to_user": row["to_user"],
+        "decision": row["decision"],
+    })
+    return {"ok": True}
+
+
+def service_notifications(user_id):
+    me = get_profile(user_id)
+    if me is None:
+        raise UnknownUser(user_id)
+    with timed_block("notifications.mutual"):
+        graph = get_match_graph()
+        mutual_ids = sorted(graph.mutual_matches(user_id), key=str)
+        liked_ids = sorted(graph.liked_me_only(user_id), key=str)
+    manner = get_manner_table()
+    ratings = get_rating_index()
+    mutual = []
+    for pid in mutual_ids:
+        partner = get_profile(pid)
+        if partner is not None:
+            mutual.append({
+                "profile": _profile_dict(partner),
+                "manner": manner.get(pid),
+                "my_rating": _json_value(ratings.get(user_id, pid)),
+            })
+    # 상대만 ♥ 한 사람의 연락처는 내보내지 않는다
+    public = [c for c in PROFILE_COLUMNS if c != "contact_info"]
+    liked = [{"profile": _profile_dict(get_profile(pid), public)} for pid in liked_ids if get_profile(pid) is not None]
+    return {
+        "manner": manner.get(user_id),
+        "contact": _json_value(me["contact_info"]),
+        "mutual": mutual,
+        "liked_me": liked,
+    }
+
+
+def service_rate(row):
+    # 정수(또는 9.0 같은 정수 값, "7" 같은 숫자 문자열)만 받는다. 9.7, True 는 거절
+    rating = row.get("rating")
+    if isinstance(rating, str) and rating.strip().isascii() and rating.strip().isdigit():
+        rating = int(rating)
+    if isinstance(rating, float) and rating.is_integer():
+        rating = int(rating)
+    if isinstance(rating, bool) or not isinstance(rating, int) or not 1 <= rating <= 10:
+        raise ValueError("rating 은 1~10 정수여야 합니다")
+    if not row.get("from_user") or not row.get("to_user"):
+        raise ValueError("from_user, to_user 가 필요합니다")
+    upsert_rating({
+        "timestamp": row.get("timestamp") or datetime.now().isoformat(),
+        "from_user": row["from_user"],
+        "to_user": row["to_user"],
+        "rating": rating,
+    })
+    return {"ok": True}
+
+
+class ServiceError(RuntimeError):
+    # 화면에 그대로 보여 줄 서비스 오류 (서버 연결 실패, 잘못된 입력, 서버 오류)
+    pass
+
+
+class LocalService:
+    # 같은 프로세스에서 바로 부른다 (기본). 없는 사용자는 None, 잘못된 입력(ValueError)은 ServiceError 로.
+    def version(self):
+        return service_version()
+
+    def profile(self, user_id):
+        return service_profile(user_id)
+
+    def save_profile(self, row):
+        try:
+            return service_save_profile(row)
+        except ValueError as e:
+            raise ServiceError(str(e)) from e
+
+    def match_list(self, user_id, limit=MATCH_LIST_MAX, how="mean"):
+        try:
+            return service_match_list(user_id, limit, how)
+        except UnknownUser:
+            return None
+
+    def decisions(self, user_id):
+        return service_decisions(user_id)
+
+    def decide(self, row):
+        try:
+            return service_decide(row)
+        except ValueError as e:
+            raise ServiceError(str(e)) from e
+
+    def notifications(self, user_id):
+        try:
+            return service_notifications(user_id)
+        except UnknownUser:
+            return None
+
+    def rate(self, row):
+        try:
+            return service_rate(row)
+        except ValueError as e:
+            raise ServiceError(str(e)) from e
+
+
+class HttpService:
+    # api.py 서버에 JSON 으로 요청한다. 없는 사용자(404)는 None, 나머지 실패는 ServiceError.
+    def __init__(self, base_url, timeout=API_TIMEOUT):
+        self.base_url = base_url
+        self.timeout = timeout
+
+    def _call(self, method, path, body=None, query=None):
+        url = self.base_url + path
+        if query:
+            url += "?" + urllib.parse.urlencode(query)
+        data = None if body is None else json.dumps(body, ensure_ascii=False).encode("utf-8")
+        request = urllib.request.Request(
+            url, data=data, method=method, headers={"Content-Type": "application/json"}
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return json.loads(response.read().decode("utf-8"))
+        except urllib.error.HTTPError as e:
+            if e.code == 404:
+                return None
+            try:
+                message = json.loads(e.read().decode("utf-8"))["error"]
+            except Exception:
+                message = e.reason
+            raise ServiceError(f"매칭 서버 오류 ({e.code}): {message}") from e
+        except (urllib.error.URLError, TimeoutError, ConnectionError) as e:
+            raise ServiceError(f"매칭 서버에 연결할 수 없습니다: {getattr(e, 'reason', e)}") from e
+        except ValueError as e:
+            raise ServiceError("매칭 서버 응답을 읽을 수 없습니다") from e
+
+    @staticmethod
+    def _quote(user_id):
+        return urllib.parse.quote(str(user_id), safe="")
+
+    def version(self):
+        return self._call("GET", "/version")
+
+    def profile(self, user_id):
+        return self._call("GET", f"/profiles/{self._quote(user_id)}")
+
+    def save_profile(self, row):
+        return self._call("PUT", f"/profiles/{self._quote(row['user_id'])}", row)
+
+    def match_list(self, user_id, limit=MATCH_LIST_MAX, how="mean"):
+        return self._call("GET", f"/users/{self._quote(user_id)}/candidates", query={"limit": limit, "how": how})
+
+    def decisions(self, user_id):
+        return self._call("GET", f"/users/{self._quote(user_id)}/decisions") or {}
+
+    def decide(self, row):
+        return self._call("POST", "/decisions", row)
+
+    def notifications(self, user_id):
+        return self._call("GET", f"/users/{self._quote(user_id)}/notifications")
+
+    def rate(self, row):
+        return self._call("POST", "/ratings", row)
+
+
+@st.cache_resource
+def get_service():
+    if API_URL:
+        return HttpService(API_URL)
+    return LocalService()
+
+
 # ------------------------------
 # 설문 페이지
 # ------------------------------
 def register_survey():
     st.subheader("STEP 1 · 프로필 작성")
 
-    df = load_data()
-
     default_id = st.session_state.get("user_id", "")
     user_id = st.text_input("닉네임 (로그인에 사용할 이름)", max_chars=30, value=default_id)
 
-    prev = None
-    if user_id and user_id in df["user_id"].values:
-        prev = df[df["user_id"] == user_id].iloc[0]
+    prev = get_service().profile(user_id) if user_id else None
+    if prev is not None:
         st.success("기존 설문을 불러왔어요. 수정 후 다시 저장하면 업데이트됩니다.")
 
-    purpose_options = ["친구", "연애", "스터디", "취미", "기타"]
-    match_mode_options = ["1:1 매칭", "다인원 매칭", "팀 매칭 (친구와 함께)"]
-    group_scope_options = ["전체 공개", "특정 그룹 내에서"]
+    purpose_options = PURPOSE_OPTIONS
+    match_mode_options = MATCH_MODE_OPTIONS
+    group_scope_options = GROUP_SCOPE_OPTIONS
 
     purpose_default = get_prev(prev, "purpose", "친구")
     match_mode_default = get_prev(prev, "match_mode", "1:1 매칭")
@@ -334,12 +3184,9 @@ def register_survey():
     st.markdown("---")
     st.markdown("#### 나에 대한 정보")
 
-    personality_options = [
-        "내향적", "외향적", "차분함", "활발함", "유머있음",
-        "논리적", "감성적", "리더형", "서포터형", "즉흥적", "계획적",
-    ]
-    appearance_base = ["강아지상", "고양이상", "여우상", "토끼상", "곰상", "사슴상", "공룡상", "기타"]
-    body_type_options = ["저체중", "보통", "과체중"]
+    personality_options = PERSONALITY_OPTIONS
+    appearance_base = APPEARANCE_OPTIONS
+    body_type_options = BODY_TYPE_OPTIONS
 
     col1, col2 = st.columns(2)
     with col1:
@@ -353,9 +3200,9 @@ def register_survey():
         self_age = st.number_input("나이", 10, 100, self_age_default)
         self_gender = st.selectbox(
             "성별",
-            ["여성", "남성", "기타"],
-            index=["여성", "남성", "기타"].index(self_gender_default)
-            if self_gender_default in ["여성", "남성", "기타"]
+            GENDER_OPTIONS,
+            index=GENDER_OPTIONS.index(self_gender_default)
+            if self_gender_default in GENDER_OPTIONS
             else 0,
         )
         self_height = st.number_input("키 (cm)", 130, 220, self_height_default)
@@ -405,9 +3252,9 @@ def register_survey():
     with st.columns(2)[0]:
         pref_gender = st.selectbox(
             "원하는 성별",
-            ["상관없음", "여성", "남성"],
-            index=["상관없음", "여성", "남성"].index(pref_gender_default)
-            if pref_gender_default in ["상관없음", "여성", "남성"]
+            PREF_GENDER_OPTIONS,
+            index=PREF_GENDER_OPTIONS.index(pref_gender_default)
+            if pref_gender_default in PREF_GENDER_OPTIONS
             else 0,
         )
         pref_min_age, pref_max_age = st.slider(
@@ -463,7 +3310,6 @@ def register_survey():
             return
 
         st.session_state["user_id"] = user_id
-        df = df[df["user_id"] != user_id]
 
         new_row = {
             "timestamp": datetime.now().isoformat(),
@@ -494,14 +3340,22 @@ def register_survey():
             "team_code": team_code,
         }
 
-        df = pd.concat([df, pd.DataFrame([new_row])], ignore_index=True)
-        save_data(df)
+        get_service().save_profile(new_row)
         st.success("프로필이 저장되었습니다. 이제 상단 탭에서 매칭을 확인해 보세요.")
 
 
 # ------------------------------
 # 매칭 보기 페이지
 # ------------------------------
+def session_memo(name, key, compute):
+    # 세션마다 마지막 결과 하나만 기억한다. key 가 같으면 rerun 해도 다시 계산하지 않는다.
+    memo = st.session_state.get(name)
+    if memo is None or memo["key"] != key:
+        memo = {"key": key, "value": compute()}
+        st.session_state[name] = memo
+    return memo["value"]
+
+
 def show_match_page():
     st.subheader("STEP 2 · 매칭 보기")
 
@@ -516,141 +3370,229 @@ def show_match_page():
         st.info("매칭을 보려면 먼저 닉네임을 입력하거나 프로필을 저장해 주세요.")
         return
 
-    df = load_data()
-    if df.empty:
+    service = get_service()
+    version = service.version()
+    if not version["profiles"]:
         st.warning("아직 프로필 데이터가 없습니다. 먼저 '프로필 작성'에서 정보를 입력해 주세요.")
         return
 
-    if user_id not in df["user_id"].values:
+    me = service.profile(user_id)
+    if me is None:
         st.error("해당 ID로 저장된 프로필이 없습니다. 철자 또는 대소문자를 확인해 주세요.")
         return
 
     st.session_state["user_id"] = user_id
 
-    me = df[df["user_id"] == user_id].iloc[0]
-    others = df[df["user_id"] != user_id].copy()
-
-    if others.empty:
+    if version["profiles"] <= 1:
         st.info("아직 다른 사용자가 프로필을 등록하지 않았습니다.")
         return
 
-    decisions = load_decisions()
+    my_decisions = service.decisions(user_id)
 
     max_results = st.slider("한 번에 볼 매칭 후보 수", 1, 20, 5)
 
-    scores = []
-    for _, row in others.iterrows():
-        s = calc_match_score(me, row)
-        if s > 0:
-            scores.append((row["user_id"], s))
+    # 팀 점수 방식 라디오는 팀 목록을 그릴 때 나오므로 지난 선택값으로 먼저 계산한다
+    how = TEAM_AGGREGATES.get(st.session_state.get("team_aggregate"), "mean")
 
-    if not scores:
-        st.info("지금 설정된 조건으로는 매칭 후보가 없습니다. 조건을 조금 완화해 보는 건 어떨까요?")
+    # 슬라이더를 움직이거나 ♥/패스를 눌러도 프로필/별점이 그대로면 다시 계산하지 않는다
+    key = (user_id, str(me["timestamp"]), how, version["version"])
+    listing = session_memo("match_ranking", key, lambda: service.match_list(user_id, MATCH_LIST_MAX, how))
+    if listing is None:
+        st.error("해당 ID로 저장된 프로필이 없습니다. 철자 또는 대소문자를 확인해 주세요.")
+        return
+
+    # 팀 코드가 있는 팀 매칭은 사람 대신 팀 단위로 보여 준다
+    if listing["kind"] == "teams":
+        show_team_matches(user_id, listing, my_decisions, max_results)
         return
 
-    scores.sort(key=lambda x: x[1], reverse=True)
-    top_ids = [u for u, _ in scores[:max_results]]
+    if "group" in listing:
+        show_my_group(user_id, listing["group"])
+    elif "daily_pick" in listing:
+        show_daily_pick(listing["daily_pick"])
+    elif me["match_mode"] == "다인원 매칭":
+        st.caption("아직 배정된 다인원 그룹이 없어요. 조건이 서로 맞는 사람들끼리 주기적으로 새로 묶어 드려요.")
 
-    top_df = others[others["user_id"].isin(top_ids)].copy()
-    top_df["score"] = top_df["user_id"].map(dict(scores))
+    ranking = listing["candidates"]
+    if not ranking:
+        st.info("지금 설정된 조건으로는 매칭 후보가 없습니다. 조건을 조금 완화해 보는 건 어떨까요?")
+        return
+
+    # 슬라이더 값만큼씩 페이지로 나누고, 지금 페이지의 요약 줄만 그린다
+    n_pages = -(-len(ranking) // max_results)
+    page = 1
+    if n_pages > 1:
+        page = st.radio("페이지", list(range(1, n_pages + 1)), horizontal=True, key="match_page_no")
+    visible = ranking[(page - 1) * max_results:page * max_results]
 
     st.markdown("##### 나와 잘 맞는 사람들 (점수 순 정렬)")
 
-    for _, row in top_df.sort_values("score", ascending=False).iterrows():
-        partner_id = row["user_id"]
-        partner_mt = get_user_manner_temperature(partner_id)
+    open_card = st.session_state.get("open_card")
+    with timed_block("match_page.render"):
+        for cand in visible:
+            partner_id = cand["user_id"]
+            my_decision = my_decisions.get(partner_id)
 
-        dec_me = decisions[
-            (decisions["from_user"] == user_id) & (decisions["to_user"] == partner_id)
-        ]
-        my_decision = dec_me["decision"].iloc[0] if not dec_me.empty else None
+            if my_decision == "수락":
+                icon = "♥"
+            elif my_decision == "거절":
+                icon = "×"
+            else:
+                icon = "♡"
+
+            is_open = open_card == partner_id
+            col_label, col_toggle = st.columns([5, 1])
+            col_label.markdown(
+                f"{icon} **{partner_id}** 님 · 점수 {cand['score']:.1f} · 매너온도 {cand['manner']}°"
+            )
+            col_toggle.button(
+                "닫기" if is_open else "자세히",
+                key=f"card_{partner_id}",
+                on_click=_toggle_card,
+                args=(partner_id,),
+            )
+            # 카드 내용은 펼친 한 장만 만든다
+            if is_open:
+                partner = service.profile(partner_id)
+                if partner is not None:
+                    with st.container(border=True):
+                        show_candidate_card(user_id, partner, cand["manner"], my_decision)
+
+
+def _toggle_card(partner_id):
+    if st.session_state.get("open_card") == partner_id:
+        st.session_state["open_card"] = None
+    else:
+        st.session_state["open_card"] = partner_id
+
+
+def _decide(user_id, partner_ids, decision):
+    service = get_service()
+    for partner_id in partner_ids:
+        service.decide({
+            "timestamp": datetime.now().isoformat(),
+            "from_user": user_id,
+            "to_user": partner_id,
+            "decision": decision,
+        })
+
+
+def show_candidate_card(user_id, row, partner_mt, my_decision):
+    partner_id = row["user_id"]
+    st.write("**사용 목적:**", row["purpose"])
+    if isinstance(row["group_name"], str) and row["group_name"].strip():
+        st.write("**그룹:**", f"{row['group_name']} ({row['group_scope']})")
+    else:
+        st.write("**그룹:**", row["group_scope"])
+
+    st.write("---")
+    st.write("**상대 프로필**")
+    st.write(f"- 나이: {row['self_age']}")
+    st.write(f"- 성별: {row['self_gender']}")
+    st.write(f"- 성격: {row['self_personality']}")
+    st.write(f"- 외모 타입: {row['self_appearance']}")
+    st.write(f"- 체형: {row['self_body_type']}")
+    if isinstance(row.get("self_mbti", ""), str) and row.get("self_mbti", "").strip():
+        st.write(f"- MBTI: {row['self_mbti']}")
+    st.write(f"- 키: {row['self_height']} cm")
+    st.write(f"- 현재 매너온도: {partner_mt}°")
+
+    st.write("---")
+    st.write("**상대가 원하는 이상형**")
+    st.write(f"- 나이 범위: {row['pref_min_age']} ~ {row['pref_max_age']}")
+    st.write(f"- 성별: {row['pref_gender']}")
+    st.write(f"- 선호 성격: {row['pref_personality']}")
+    st.write(f"- 선호 외모: {row['pref_appearance']}")
+    st.write(f"- 선호 체형: {row['pref_body_type']}")
+    st.write(f"- 키 범위: {row['pref_min_height']} ~ {row['pref_max_height']} cm")
+
+    st.write("---")
+    st.write("**이 사람과의 매칭 여부**")
+
+    if my_decision:
+        st.info(
+            f"내 선택: **{my_decision}** (최종 결과는 '매칭 알림 & 매너온도' 탭에서 확인할 수 있어요.)"
+        )
+    else:
+        col_a, col_b = st.columns(2)
+        with col_a:
+            if st.button("♥ 이 사람 마음에 들어요", key=f"accept_{partner_id}"):
+                _decide(user_id, [partner_id], "수락")
+                st.success(
+                    "수락으로 저장되었습니다. '매칭 알림 & 매너온도' 탭에서 최종 매칭을 확인해 보세요."
+                )
+                st.rerun()
+        with col_b:
+            if st.button("패스할래요", key=f"reject_{partner_id}"):
+                _decide(user_id, [partner_id], "거절")
+                st.warning("거절로 저장되었습니다. 이 상대와는 매칭되지 않습니다.")
+                st.rerun()
+
+
+def show_my_group(user_id, group):
+    others = [u for u in group["members"] if u != user_id]
+    st.success(f"이번 그룹: **{user_id}**, {', '.join(others)} · 그룹 궁합 {group['score']:.1f}점")
 
-        if my_decision == "수락":
-            icon = "♥"
-        elif my_decision == "거절":
-            icon = "×"
+
+def show_daily_pick(pick):
+    st.success(f"오늘의 추천: **{pick['user_id']}** 님 · 서로 점수 {pick['score']:.1f}")
+
+
+def show_team_matches(user_id, listing, my_decisions, max_results):
+    members = listing["members"]
+
+    if not listing["ready"]:
+        size = listing["size"]
+        if size is None:
+            st.warning("팀원끼리 목적이나 인원 수가 서로 다르게 저장되어 있어요. 팀원들과 프로필을 맞춰 주세요.")
         else:
-            icon = "♡"
+            st.info(
+                f"우리 팀: {', '.join(members)} ({len(members)}/{size}명). "
+                "팀원이 모두 같은 팀 코드로 프로필을 저장하면 같은 인원 수의 다른 팀과 매칭돼요."
+            )
+        return
 
-        label = f"{icon} {partner_id} 님 · 점수 {row['score']:.1f} · 매너온도 {partner_mt}°"
+    st.radio("팀 점수 계산 방식", list(TEAM_AGGREGATES), horizontal=True, key="team_aggregate")
+    top = listing["candidates"][:max_results]
 
+    st.caption(f"우리 팀: {', '.join(members)}")
+    if not top:
+        st.info("지금은 우리 팀과 맞는 다른 팀이 없습니다. 다른 팀이 모두 모이면 다시 확인해 보세요.")
+        return
+
+    st.markdown("##### 우리 팀과 잘 맞는 팀 (점수 순 정렬)")
+    for team in top:
+        rival_members = team["members"]
+        # 팀 코드는 내보내지 않으므로 위젯 key 는 팀원 닉네임으로 만든다
+        team_key = "|".join(rival_members)
+        picked = {my_decisions.get(m) for m in rival_members}
+        if picked == {"수락"}:
+            icon, my_decision = "♥", "수락"
+        elif picked == {"거절"}:
+            icon, my_decision = "×", "거절"
+        else:
+            icon, my_decision = "♡", None
+
+        label = f"{icon} {', '.join(rival_members)} 팀 · {len(rival_members)}명 · 점수 {team['score']:.1f}"
         with st.expander(label):
-            st.write("**사용 목적:**", row["purpose"])
-            if isinstance(row["group_name"], str) and row["group_name"].strip():
-                st.write("**그룹:**", f"{row['group_name']} ({row['group_scope']})")
-            else:
-                st.write("**그룹:**", row["group_scope"])
-
-            st.write("---")
-            st.write("**상대 프로필**")
-            st.write(f"- 나이: {row['self_age']}")
-            st.write(f"- 성별: {row['self_gender']}")
-            st.write(f"- 성격: {row['self_personality']}")
-            st.write(f"- 외모 타입: {row['self_appearance']}")
-            st.write(f"- 체형: {row['self_body_type']}")
-            if isinstance(row.get("self_mbti", ""), str) and row.get("self_mbti", "").strip():
-                st.write(f"- MBTI: {row['self_mbti']}")
-            st.write(f"- 키: {row['self_height']} cm")
-            st.write(f"- 현재 매너온도: {partner_mt}°")
-
-            st.write("---")
-            st.write("**상대가 원하는 이상형**")
-            st.write(f"- 나이 범위: {row['pref_min_age']} ~ {row['pref_max_age']}")
-            st.write(f"- 성별: {row['pref_gender']}")
-            st.write(f"- 선호 성격: {row['pref_personality']}")
-            st.write(f"- 선호 외모: {row['pref_appearance']}")
-            st.write(f"- 선호 체형: {row['pref_body_type']}")
-            st.write(f"- 키 범위: {row['pref_min_height']} ~ {row['pref_max_height']} cm")
-
-            st.write("---")
-            st.write("**이 사람과의 매칭 여부**")
+            for person in team["people"]:
+                st.write(
+                    f"- **{person['user_id']}** · {person['self_age']}세 · {person['self_gender']} · "
+                    f"{person['self_personality']} · 매너온도 {person['manner']}°"
+                )
 
             if my_decision:
-                st.info(
-                    f"내 선택: **{my_decision}** (최종 결과는 '매칭 알림 & 매너온도' 탭에서 확인할 수 있어요.)"
-                )
-            else:
-                col_a, col_b = st.columns(2)
-                with col_a:
-                    if st.button("♥ 이 사람 마음에 들어요", key=f"accept_{partner_id}"):
-                        decisions = load_decisions()
-                        decisions = decisions[
-                            ~(
-                                (decisions["from_user"] == user_id)
-                                & (decisions["to_user"] == partner_id)
-                            )
-                        ]
-                        new_dec = {
-                            "timestamp": datetime.now().isoformat(),
-                            "from_user": user_id,
-                            "to_user": partner_id,
-                            "decision": "수락",
-                        }
-                        decisions = pd.concat([decisions, pd.DataFrame([new_dec])], ignore_index=True)
-                        save_decisions(decisions)
-                        st.success(
-                            "수락으로 저장되었습니다. '매칭 알림 & 매너온도' 탭에서 최종 매칭을 확인해 보세요."
-                        )
-                        st.rerun()
-                with col_b:
-                    if st.button("패스할래요", key=f"reject_{partner_id}"):
-                        decisions = load_decisions()
-                        decisions = decisions[
-                            ~(
-                                (decisions["from_user"] == user_id)
-                                & (decisions["to_user"] == partner_id)
-                            )
-                        ]
-                        new_dec = {
-                            "timestamp": datetime.now().isoformat(),
-                            "from_user": user_id,
-                            "to_user": partner_id,
-                            "decision": "거절",
-                        }
-                        decisions = pd.concat([decisions, pd.DataFrame([new_dec])], ignore_index=True)
-                        save_decisions(decisions)
-                        st.warning("거절로 저장되었습니다. 이 상대와는 매칭되지 않습니다.")
-                        st.rerun()
+                st.info(f"내 선택: **{my_decision}** (팀원 각각에게 저장되었어요.)")
+                continue
+            col_a, col_b = st.columns(2)
+            with col_a:
+                accept = st.button("♥ 이 팀 마음에 들어요", key=f"team_accept_{team_key}")
+            with col_b:
+                reject = st.button("패스할래요", key=f"team_reject_{team_key}")
+            if accept or reject:
+                # 팀 선택은 상대 팀원 한 명 한 명에게 같은 결정을 남기는 것과 같다
+                _decide(user_id, rival_members, "수락" if accept else "거절")
+                st.rerun()
 
 
 # ------------------------------
@@ -670,19 +3612,16 @@ def show_notifications_page():
         st.info("알림을 보려면 먼저 닉네임을 입력하거나 프로필을 저장해 주세요.")
         return
 
-    df = load_data()
-    if df.empty or user_id not in df["user_id"].values:
+    service = get_service()
+    notes = service.notifications(user_id)
+    if notes is None:
         st.error("해당 ID로 저장된 프로필이 없습니다. 먼저 '프로필 작성' 탭에서 프로필을 저장해 주세요.")
         return
 
     st.session_state["user_id"] = user_id
 
-    decisions = load_decisions()
-    ratings = load_ratings()
-
-    my_mt = get_user_manner_temperature(user_id)
-    me = df[df["user_id"] == user_id].iloc[0]
-    my_contact = me["contact_info"] if isinstance(me["contact_info"], str) else ""
+    my_mt = notes["manner"]
+    my_contact = notes["contact"] if isinstance(notes["contact"], str) else ""
 
     st.info(f"현재 내 매너온도는 **{my_mt}°** 입니다.")
     if my_contact:
@@ -690,32 +3629,15 @@ def show_notifications_page():
     else:
         st.write("아직 연락처가 없습니다. '프로필 작성' 탭에서 연락처를 추가할 수 있어요.")
 
-    accepts = decisions[decisions["decision"] == "수락"]
-
-    mutual_ids = set()
-    my_accepts = accepts[accepts["from_user"] == user_id]
-
-    for _, row in my_accepts.iterrows():
-        other = row["to_user"]
-        if not accepts[
-            (accepts["from_user"] == other) & (accepts["to_user"] == user_id)
-        ].empty:
-            mutual_ids.add(other)
-
-    liked_me_ids_all = set(accepts[accepts["to_user"] == user_id]["from_user"])
-    liked_me_only = liked_me_ids_all - mutual_ids
-
     st.markdown("##### 최종 매칭된 사람들 (서로 ♥ 수락)")
 
-    if not mutual_ids:
+    if not notes["mutual"]:
         st.info("아직 양쪽 모두 수락한 최종 매칭은 없습니다.")
     else:
-        for pid in mutual_ids:
-            partner = df[df["user_id"] == pid]
-            if partner.empty:
-                continue
-            partner = partner.iloc[0]
-            partner_mt = get_user_manner_temperature(pid)
+        for match in notes["mutual"]:
+            partner = match["profile"]
+            pid = partner["user_id"]
+            partner_mt = match["manner"]
             partner_contact = partner["contact_info"] if isinstance(partner["contact_info"], str) else ""
 
             with st.expander(f"{pid} 님과 매칭되었어요 (♥)"):
@@ -747,10 +3669,8 @@ def show_notifications_page():
                 st.write("---")
                 st.write("**매너 평가 (별점 1~10점)**")
 
-                existing_rating = ratings[
-                    (ratings["from_user"] == user_id) & (ratings["to_user"] == pid)
-                ]
-                default_rating = int(existing_rating["rating"].iloc[0]) if not existing_rating.empty else 10
+                existing_rating = match["my_rating"]
+                default_rating = int(existing_rating) if existing_rating is not None else 10
 
                 new_rating = st.slider(
                     "별점 선택",
@@ -760,35 +3680,25 @@ def show_notifications_page():
                 )
 
                 if st.button("별점 저장", key=f"rating_save_{pid}"):
-                    ratings = load_ratings()
-                    ratings = ratings[
-                        ~(
-                            (ratings["from_user"] == user_id)
-                            & (ratings["to_user"] == pid)
-                        )
-                    ]
                     new_row = {
                         "timestamp": datetime.now().isoformat(),
                         "from_user": user_id,
                         "to_user": pid,
                         "rating": new_rating,
                     }
-                    ratings = pd.concat([ratings, pd.DataFrame([new_row])], ignore_index=True)
-                    save_ratings(ratings)
+                    service.rate(new_row)
                     st.success("별점이 저장되었습니다. 상대의 매너온도에 반영됩니다.")
                     st.rerun()
 
     st.markdown("---")
     st.markdown("##### 나를 먼저 수락한 사람들 (상대만 ♥ 선택)")
 
-    if not liked_me_only:
+    if not notes["liked_me"]:
         st.info("아직 나를 먼저 수락한 사람이 없습니다.")
     else:
-        for pid in liked_me_only:
-            partner = df[df["user_id"] == pid]
-            if partner.empty:
-                continue
-            partner = partner.iloc[0]
+        for liked in notes["liked_me"]:
+            partner = liked["profile"]
+            pid = partner["user_id"]
             with st.expander(f"{pid} 님이 나를 먼저 수락했습니다 (♥)"):
                 st.write("**사용 목적:**", partner["purpose"])
                 st.write(f"- 나이: {partner['self_age']}")
@@ -801,6 +3711,53 @@ def show_notifications_page():
                 st.write("※ 이 사람을 나도 수락하면 최종 매칭으로 전환됩니다. (→ '매칭 보기' 탭에서 수락 가능)")
 
 
+# ------------------------------
+# 관리자 · 성능 페이지 (SOULY_ADMIN_TOKEN 또는 st.secrets 의 admin_token 을 아는 사람만)
+# ------------------------------
+def admin_token():
+    if ADMIN_TOKEN:
+        return ADMIN_TOKEN
+    try:
+        return str(st.secrets.get("admin_token", ""))
+    except Exception:  # secrets.toml 이 없으면
+        return ""
+
+
+def show_admin_metrics_page():
+    st.subheader("관리자 · 성능 지표")
+
+    token = admin_token()
+    if not st.session_state.get("admin_ok"):
+        entered = st.text_input("관리자 토큰", type="password", key="admin_token")
+        if not token or not hmac.compare_digest(entered.encode("utf-8"), token.encode("utf-8")):
+            if entered:
+                st.error("토큰이 맞지 않습니다.")
+            return
+        st.session_state["admin_ok"] = True
+
+    if not METRICS_ENABLED:
+        st.info("측정이 꺼져 있습니다. SOULY_METRICS=1 로 실행하면 구간별 시간이 기록됩니다.")
+
+    snapshot = get_metrics().snapshot()
+    if snapshot:
+        st.dataframe(pd.DataFrame(snapshot), use_container_width=True, hide_index=True)
+    else:
+        st.write("아직 기록된 호출이 없습니다.")
+
+    st.markdown("##### 표 캐시")
+    st.json(cache_stats())
+
+    if st.button("Prometheus 파일로 내보내기", key="export_metrics"):
+        export_prometheus()
+        st.success(f"{METRICS_FILE} 에 저장했습니다.")
+    st.download_button(
+        "Prometheus 텍스트 다운로드",
+        get_metrics().to_prometheus(),
+        file_name="souly_metrics.prom",
+        mime="text/plain",
+    )
+
+
 # ------------------------------
 # 온보딩 가이드 모달 (슬라이드)
 # ------------------------------
@@ -1072,21 +4029,54 @@ def main():
     # 온보딩 가이드
     show_guide_modal()
 
-    menu = st.sidebar.radio(
-        "탭 이동",
-        ["프로필 작성", "매칭 보기", "매칭 알림 & 매너온도"],
-    )
+    tabs = ["프로필 작성", "매칭 보기", "매칭 알림 & 매너온도"]
+    if admin_token():
+        tabs.append("관리자 · 성능")
+    menu = st.sidebar.radio("탭 이동", tabs)
 
     st.markdown('<div class="section-card">', unsafe_allow_html=True)
-    if menu == "프로필 작성":
-        register_survey()
-    elif menu == "매칭 보기":
-        show_match_page()
-    else:
-        show_notifications_page()
+    try:
+        if menu == "프로필 작성":
+            register_survey()
+        elif menu == "매칭 보기":
+            show_match_page()
+        elif menu == "관리자 · 성능":
+            show_admin_metrics_page()
+        else:
+            show_notifications_page()
+    except ServiceError as e:
+        st.error(str(e))
     st.markdown("</div>", unsafe_allow_html=True)
     st.markdown("</div>", unsafe_allow_html=True)
 
 
 if __name__ == "__main__":
-    main()
+    if "--migrate-sqlite" in sys.argv:
+        for table, n in migrate_csv_to_sqlite().items():
+            print(f"{table}: {n} rows")
+    elif "--compact-logs" in sys.argv:
+        compact_logs()
+    elif "--form-groups" in sys.argv:
+        started = time.perf_counter()
+        summary = form_groups(time_budget=_int_arg("--budget", GROUP_TIME_BUDGET))
+        print(f"{summary} in {time.perf_counter() - started:.1f}s")
+    elif "--assign-pairs" in sys.argv:
+        started = time.perf_counter()
+        summary = run_daily_picks(top_k=_int_arg("--top-k", BATCH_TOP_K))
+        print(f"{summary} in {time.perf_counter() - started:.1f}s")
+    elif "--ann-recall" in sys.argv:
+        print(ann_recall(
+            sample=_int_arg("--sample", 50),
+            k=_int_arg("--top-k", 20),
+            shortlist=_int_arg("--shortlist", ANN_SHORTLIST),
+            nprobe=_int_arg("--nprobe", ANN_NPROBE),
+        ))
+    elif "--batch-score" in sys.argv:
+        started = time.perf_counter()
+        summary = run_batch_scoring(
+            top_k=_int_arg("--top-k", BATCH_TOP_K),
+            workers=_int_arg("--workers", None),
+        )
+        print(f"{summary} in {time.perf_counter() - started:.1f}s")
+    else:
+        main()
@@ -0,0 +1,15 @@
+import pytest
+
+import main
+
+
+@pytest.fixture()
+def workdir(tmp_path, monkeypatch):
+    # 빈 폴더에서 저장소 / 표 캐시를 새로 시작하고, 끝나면 뒤에서 쓰던 것을 모두 쓴 뒤 비운다
+    monkeypatch.chdir(tmp_path)
+    main.get_storage.clear()
+    main.get_table_cache().invalidate()
+    yield tmp_path
+    main.flush_writes()
+    main.get_storage.clear()
+    main.get_table_cache().invalidate()
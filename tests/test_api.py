@@ -0,0 +1,74 @@
+# ------------------------------
+# api.dispatch: 상태 코드 (200 / 400 / 404 / 405 / 500) 와 JSON 본문.
+# ------------------------------
+import json
+import logging
+
+import pytest
+
+import api
+import main
+from bench.synth import write_dataset
+
+
+@pytest.fixture()
+def users(workdir, monkeypatch):
+    monkeypatch.setattr(main, "WRITE_BEHIND", False)
+    write_dataset(60, seed=5)
+    return main.load_data()["user_id"].tolist()
+
+
+def _call(method, target, body=None):
+    raw = b"" if body is None else json.dumps(body, ensure_ascii=False).encode("utf-8")
+    return api.dispatch(method, target, raw)
+
+
+def test_ok(users):
+    assert _call("GET", "/health") == (200, {"ok": True})
+    status, profile = _call("GET", f"/profiles/{users[0]}")
+    assert status == 200 and profile["user_id"] == users[0]
+    status, listing = _call("GET", f"/users/{users[0]}/candidates?limit=5")
+    assert status == 200 and "kind" in listing
+    assert _call("POST", "/ratings", {"from_user": users[0], "to_user": users[1], "rating": 9}) == (200, {"ok": True})
+
+
+def test_bad_input_is_400(users):
+    profile = _call("GET", f"/profiles/{users[0]}")[1]
+    assert _call("PUT", f"/profiles/{users[0]}", dict(profile, self_age="스물"))[0] == 400
+    assert _call("PUT", f"/profiles/{users[0]}", dict(profile, user_id="다른사람"))[0] == 400
+    assert _call("POST", "/ratings", {"from_user": "a", "to_user": "b", "rating": 9.7})[0] == 400
+    assert _call("POST", "/decisions", {"from_user": "a", "to_user": "b", "decision": "글쎄"})[0] == 400
+    assert _call("GET", f"/users/{users[0]}/candidates?limit=많이")[0] == 400
+    assert api.dispatch("POST", "/ratings", b"[1, 2]")[0] == 400
+    assert api.dispatch("POST", "/ratings", b"{not json")[0] == 400
+
+
+def test_unknown_user_or_path_is_404(users):
+    for target in ("/profiles/없는사람", "/users/없는사람/candidates", "/users/없는사람/notifications", "/nowhere"):
+        assert _call("GET", target)[0] == 404
+
+
+def test_wrong_method_is_405(users):
+    assert _call("DELETE", "/health")[0] == 405
+    assert _call("GET", "/ratings")[0] == 405
+
+
+def test_internal_key_error_is_500_and_logged(users, monkeypatch, caplog):
+    # 코드 안의 KeyError 를 없는 사용자(404)로 숨기지 않는다
+    def broken(*args):
+        return {}["missing"]
+
+    monkeypatch.setattr(main, "service_match_list", broken)
+    with caplog.at_level(logging.ERROR, logger="souly.api"):
+        status, payload = _call("GET", f"/users/{users[0]}/candidates")
+    assert (status, payload) == (500, {"error": "서버 오류"})
+    assert "KeyError" in caplog.text
+
+
+def test_local_service_hides_only_unknown_users(users, monkeypatch):
+    service = main.LocalService()
+    assert service.match_list("없는사람") is None
+    assert service.notifications("없는사람") is None
+    monkeypatch.setattr(main, "service_notifications", lambda user_id: {}["missing"])
+    with pytest.raises(KeyError):
+        service.notifications(users[0])
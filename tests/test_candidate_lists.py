@@ -0,0 +1,76 @@
+# ------------------------------
+# refresh_candidate_lists: 프로필 하나를 고칠 때마다 match_topk 의 해당 목록만 고친 결과가
+# 처음부터 다시 계산한 top_k_matches 와 같은지 (고치기 / 새로 가입 / 다른 칸으로 떠나기).
+# ------------------------------
+import random
+from datetime import datetime
+
+import pytest
+
+import main
+from bench.synth import generate_profiles, write_dataset
+
+K = 5
+
+
+@pytest.fixture()
+def batch(workdir, monkeypatch):
+    monkeypatch.setattr(main, "WRITE_BEHIND", False)
+    write_dataset(300, seed=11)
+    main.run_batch_scoring(top_k=K, workers=1)
+    return main.load_data()
+
+
+def _upsert(row):
+    row = dict(row, timestamp=datetime.now().isoformat())
+    main._upsert_table("profiles", row)
+    return main.refresh_candidate_lists(row["user_id"])
+
+
+def _rounded(pairs):
+    return [(uid, round(float(score), 9)) for uid, score in pairs]
+
+
+def _check_lists():
+    df = main.load_data()
+    batch = main.get_batch_results()
+    assert batch.top_k == K
+    topk = main.get_storage().load("match_topk")
+    heads = topk[topk["rank"] == 0]
+    assert set(heads["score"].abs()) == {K}
+    kept = 0
+    for _, me in df.iterrows():
+        others = df[df["user_id"].isin(main.get_candidate_index().candidates_for(me))]
+        exact = _rounded(main.top_k_matches(main.live_match_scores(me, others), K))
+        if batch.lookup(me) is not None:
+            kept += 1
+            assert _rounded(batch.current(me["user_id"])) == exact, me["user_id"]
+        assert _rounded(main.top_k_matches(main.iter_match_scores(me, df), K)) == exact, me["user_id"]
+    return kept
+
+
+def test_patched_lists_match_recomputed(batch):
+    rng = random.Random(3)
+    fresh = generate_profiles(60, seed=99)
+    ids = batch["user_id"].tolist()
+    dropped = 0
+    for i in range(20):
+        row = fresh.iloc[i].to_dict()
+        kind = i % 3
+        if kind == 0:  # 기존 사람이 프로필을 고침
+            row["user_id"] = rng.choice(ids)
+        elif kind == 1:  # 새로 가입
+            row["user_id"] = f"new{i}"
+        else:  # 가장 많은 목록에 든 사람이 목적을 바꿔 원래 칸의 모든 목록에서 빠짐
+            topk = main.get_storage().load("match_topk")
+            popular = topk.loc[topk["rank"] > 0, "candidate_id"].value_counts().index[0]
+            row = main.get_profile(popular)[main.PROFILE_COLUMNS].to_dict()
+            row["purpose"] = next(p for p in main.PURPOSE_OPTIONS if p != row["purpose"])
+        result = _upsert(row)
+        assert result["patched"] >= 1
+        dropped += result["dropped"]
+    assert dropped > 0  # 꽉 찬 목록에서 빠져 버린 경우도 지나갔다
+    kept = _check_lists()
+    assert kept > len(ids) // 2  # 대부분의 목록은 버리지 않고 고쳐 썼다
+    stale = main.get_batch_results().stale
+    assert all(main.get_batch_results().lookup(main.get_profile(uid)) is None for uid in stale)
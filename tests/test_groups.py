@@ -0,0 +1,86 @@
+# ------------------------------
+# GroupSolver / form_groups: 그룹은 정확히 인원 수만큼, 그룹 안 모든 쌍이 양방향 점수 > 0,
+# 한 사람은 한 그룹에만. 시간 예산은 이웃 찾기 / 시드 묶기까지 포함해서 지킨다.
+# ------------------------------
+import itertools
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import main
+
+
+def _people(n, seed=0, size=3):
+    rng = np.random.default_rng(seed)
+    personality = np.array(main.PERSONALITY_OPTIONS, dtype=object)
+    rows = []
+    for i in range(n):
+        age = int(rng.integers(20, 35))
+        lo = int(rng.integers(18, 26))
+        rows.append({
+            "timestamp": "2026-01-01T00:00:00", "user_id": f"g{i}", "purpose": "친구",
+            "match_mode": "다인원 매칭", "group_size": size, "group_scope": "전체 공개", "group_name": np.nan,
+            "self_age": age, "self_gender": rng.choice(main.GENDER_OPTIONS[:2]), "self_height": int(rng.integers(150, 190)),
+            "self_personality": ";".join(rng.choice(personality, 2, replace=False)),
+            "self_appearance": rng.choice(main.APPEARANCE_OPTIONS), "self_body_type": rng.choice(main.BODY_TYPE_OPTIONS),
+            "pref_min_age": lo, "pref_max_age": lo + int(rng.integers(6, 15)),
+            "pref_gender": rng.choice(main.PREF_GENDER_OPTIONS, p=[0.6, 0.2, 0.2]),
+            "pref_min_height": 150, "pref_max_height": 190,
+            "pref_personality": ";".join(rng.choice(personality, 3, replace=False)),
+            "pref_appearance": "상관없음", "pref_body_type": "상관없음",
+            "blacklist_personality": rng.choice(personality) if rng.random() < 0.3 else np.nan,
+            "blacklist_appearance": np.nan,
+        })
+    return main.add_score_columns(pd.DataFrame(rows, columns=main.PROFILE_COLUMNS))
+
+
+def _check_groups(part, groups, size):
+    rows = part.set_index("user_id", drop=False)
+    seen = set()
+    for members, score in groups:
+        assert len(members) == size
+        assert not seen & set(members)
+        seen |= set(members)
+        for a, b in itertools.permutations(members, 2):
+            assert main.calc_match_score(rows.loc[a], rows.loc[b]) > 0, (a, b)
+        assert score > 0
+    return seen
+
+
+@pytest.mark.parametrize("size", [2, 3, 4])
+def test_groups_respect_hard_filters_and_size(workdir, size):
+    part = _people(240, seed=size, size=size)
+    groups = main.GroupSolver(part, size).solve(1.0)
+    assigned = _check_groups(part, groups, size)
+    assert len(assigned) > len(part) // 2
+
+
+def test_form_groups_writes_valid_groups(workdir):
+    people = pd.concat([_people(120, seed=1, size=3), _people(90, seed=2, size=2)], ignore_index=True)
+    people["user_id"] = [f"p{i}" for i in range(len(people))]
+    main.save_data(people.drop(columns=main.SCORE_COLUMNS))
+    summary = main.form_groups(time_budget=1)
+    assert summary["groups"] > 0
+    assignments = main.get_group_assignments()
+    for gid, members in assignments.members.items():
+        size = int(main.get_profile(members[0])["group_size"])
+        _check_groups(main.load_data(), [(members, assignments.scores[gid])], size)
+
+
+def test_budget_covers_neighbor_search_and_seeding(workdir):
+    part = _people(6000, seed=9)
+    solver = main.GroupSolver(part, 3)
+    started = time.perf_counter()
+    solver._neighbors(float("inf"))
+    unbounded = time.perf_counter() - started
+
+    budget = unbounded / 4
+    solver = main.GroupSolver(part, 3)
+    started = time.perf_counter()
+    groups = solver.solve(budget)
+    elapsed = time.perf_counter() - started
+    # 예산이 끝난 뒤에는 지금 하던 256 명 한 묶음 / 그룹 하나까지만 더 한다
+    assert elapsed < budget + unbounded / 2
+    _check_groups(part, groups, 3)
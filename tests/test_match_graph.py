@@ -0,0 +1,96 @@
+# ------------------------------
+# MatchGraph / PairIndex: ♥ → 최종 매칭 → ♥ 취소를 한 줄씩 고친 결과가 결정 표로 처음부터 만든 것과 같은지.
+# ------------------------------
+import random
+
+import pandas as pd
+import pytest
+
+import main
+
+COLUMNS = ["timestamp", "from_user", "to_user", "decision"]
+
+
+def _row(a, b, decision):
+    return {"timestamp": "t", "from_user": a, "to_user": b, "decision": decision}
+
+
+class Decisions:
+    # 결정 표와 그 표로 만든 MatchGraph 를 apply_upsert 로 같이 고친다 (TableCache 와 같은 순서)
+    def __init__(self):
+        self.rows = {}
+        self.graph = main.MatchGraph(pd.DataFrame(columns=COLUMNS))
+
+    def decide(self, a, b, decision):
+        row = _row(a, b, decision)
+        old = self.rows.get((a, b))
+        self.rows[(a, b)] = row
+        self.graph.apply_upsert(row, old)
+
+    def rebuilt(self):
+        return main.MatchGraph(pd.DataFrame(list(self.rows.values()), columns=COLUMNS))
+
+
+def _view(graph, users):
+    return {u: (set(graph.mutual_matches(u)), set(graph.liked_me_only(u))) for u in users}
+
+
+@pytest.mark.parametrize("first, second", [("a", "b"), ("b", "a")])
+def test_mutual_created_and_removed_in_either_order(first, second):
+    d = Decisions()
+    other = {"a": "b", "b": "a"}
+    d.decide(first, other[first], "수락")
+    assert d.graph.liked_me_only(other[first]) == {first}
+    assert d.graph.mutual_matches(first) == frozenset()
+
+    d.decide(second, other[second], "수락")
+    assert d.graph.mutual_matches("a") == {"b"} and d.graph.mutual_matches("b") == {"a"}
+    assert d.graph.liked_me_only("a") == frozenset() and d.graph.liked_me_only("b") == frozenset()
+
+    # 먼저 ♥ 한 쪽이 취소해도, 나중에 한 쪽이 취소해도 남은 ♥ 는 상대의 "나만 받은 ♥" 로 돌아간다
+    d.decide(first, other[first], "거절")
+    assert d.graph.mutual_matches("a") == frozenset() and d.graph.mutual_matches("b") == frozenset()
+    assert d.graph.liked_me_only(first) == {second}
+    assert _view(d.graph, "ab") == _view(d.rebuilt(), "ab")
+
+
+def test_self_like():
+    d = Decisions()
+    d.decide("a", "a", "수락")
+    assert _view(d.graph, "a") == _view(d.rebuilt(), "a")
+    d.decide("a", "a", "거절")
+    assert _view(d.graph, "a") == {"a": (set(), set())}
+
+
+def test_random_decisions_match_rebuilt_graph():
+    rng = random.Random(0)
+    users = [f"u{i}" for i in range(8)]
+    d = Decisions()
+    for _ in range(400):
+        d.decide(rng.choice(users), rng.choice(users), rng.choice(main.DECISION_OPTIONS))
+        assert _view(d.graph, users) == _view(d.rebuilt(), users)
+
+
+def test_returned_sets_are_copies():
+    d = Decisions()
+    d.decide("a", "b", "수락")
+    d.decide("c", "b", "수락")
+    d.decide("b", "a", "수락")
+    mutual = d.graph.mutual_matches("b")
+    liked = d.graph.liked_me_only("b")
+    with pytest.raises(AttributeError):
+        mutual.add("x")
+    d.decide("b", "c", "수락")
+    # 예전에 받은 값은 그대로, 그래프는 새 결정만 반영
+    assert mutual == {"a"} and liked == {"c"}
+    assert d.graph.mutual_matches("b") == {"a", "c"}
+    assert d.graph.liked_me_only("b") == frozenset()
+
+
+def test_pair_index_sent_by_is_a_copy():
+    index = main.PairIndex(pd.DataFrame([_row("a", "b", "수락")], columns=COLUMNS), "decision")
+    sent = index.sent_by("a")
+    sent["c"] = "거절"
+    assert index.sent_by("a") == {"b": "수락"}
+    index.apply_upsert(_row("a", "b", "거절"), None)
+    assert index.get("a", "b") == "거절" and sent["b"] == "수락"
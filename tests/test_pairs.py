@@ -0,0 +1,56 @@
+# ------------------------------
+# 오늘의 추천 (assign_pairs / run_daily_picks): 한 사람은 한 쌍에만, 쌍은 양방향 점수 > 0.
+# ------------------------------
+import pytest
+
+import main
+from bench.synth import write_dataset
+
+
+@pytest.fixture()
+def profiles(workdir, monkeypatch):
+    monkeypatch.setattr(main, "WRITE_BEHIND", False)
+    write_dataset(800, seed=13)
+    return main.load_data()
+
+
+def _check_pairs(df, pairs):
+    rows = df.set_index("user_id", drop=False)
+    seen = []
+    for a, b, score in pairs:
+        seen += [a, b]
+        forward = main.calc_match_score(rows.loc[a], rows.loc[b])
+        backward = main.calc_match_score(rows.loc[b], rows.loc[a])
+        assert forward > 0 and backward > 0, (a, b)
+        assert score == pytest.approx((forward + backward) / 2)
+    assert len(seen) == len(set(seen))
+    return len(pairs)
+
+
+@pytest.mark.parametrize("with_batch", [False, True])
+def test_each_user_in_at_most_one_pair(profiles, with_batch):
+    if with_batch:
+        main.run_batch_scoring(top_k=10, workers=1)
+    total = sum(_check_pairs(profiles, main.assign_pairs(part, top_k=10)) for _, part in main.pair_partitions(profiles))
+    assert total > 0
+
+
+def test_edges_without_batch_are_top_k_within_partition(profiles):
+    _, part = max(main.pair_partitions(profiles), key=lambda kp: len(kp[1]))
+    i, j = main._candidate_edges(part, 5)
+    edges = set(zip(i.tolist(), j.tolist()))
+    ids = part["user_id"].tolist()
+    for pos, (_, me) in enumerate(part.iterrows()):
+        top = main.top_k_matches(main.live_match_scores(me, part[part["user_id"] != me["user_id"]]), 5)
+        # k 번째와 같은 점수는 어느 쪽이 뽑혀도 된다
+        for candidate, _ in [pair for pair in top if len(top) < 5 or pair[1] > top[-1][1]]:
+            other = ids.index(candidate)
+            assert (min(pos, other), max(pos, other)) in edges
+
+
+def test_daily_picks_are_symmetric(profiles):
+    summary = main.run_daily_picks(top_k=10)
+    picks = main.get_daily_picks().picks
+    assert summary["pairs"] * 2 == len(picks)
+    for user_id, (partner, score) in picks.items():
+        assert picks[partner] == (user_id, score)
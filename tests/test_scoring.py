@@ -0,0 +1,171 @@
+# ------------------------------
+# calc_match_score (한 쌍씩) 과 score_candidates / score_pairs / score_matrix (벡터화) 가
+# 같은 점수를 내는지 무작위 프로필 + 빈 값 / 팀 / 그룹 경계 사례로 확인한다.
+#   python -m pytest -q
+# ------------------------------
+import random
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import main
+from bench.synth import write_dataset
+
+
+@pytest.fixture()
+def profiles(workdir):
+    # 빈 폴더에 가짜 데이터(별점 포함 → 매너온도가 사람마다 다름)를 만들고 로드한 프로필 표
+    write_dataset(300, seed=7)
+    return main.load_data()
+
+
+def _edge_cases(df, seed=0):
+    # 무작위 줄을 골라 한 군데씩 비우거나 경계 값으로 바꾼 줄들
+    rng = random.Random(seed)
+    edits = [
+        {"self_age": np.nan},
+        {"pref_min_age": np.nan},
+        {"pref_max_age": np.nan},
+        {"self_height": np.nan},
+        {"pref_min_height": np.nan},
+        {"self_gender": np.nan},
+        {"pref_gender": np.nan},
+        {"pref_gender": "상관없음"},
+        {"self_personality": np.nan},
+        {"self_personality": "새로운성격"},
+        {"pref_personality": "내향적;외향적;차분함"},
+        {"blacklist_personality": np.nan},
+        {"self_appearance": np.nan},
+        {"self_appearance": "새로운외모"},
+        {"pref_appearance": "상관없음"},
+        {"pref_appearance": np.nan},
+        {"pref_appearance": "강아지상;상관없음"},
+        {"blacklist_appearance": "강아지상;고양이상"},
+        {"self_body_type": np.nan},
+        {"pref_body_type": "상관없음"},
+        {"pref_body_type": np.nan},
+        {"group_scope": "특정 그룹 내에서", "group_name": np.nan},
+        {"group_scope": "특정 그룹 내에서", "group_name": "   "},
+        {"group_scope": "특정 그룹 내에서", "group_name": "학교0"},
+        {"group_scope": "전체 공개", "group_name": "학교0"},
+        {"match_mode": "다인원 매칭", "group_size": np.nan},
+        {"match_mode": "다인원 매칭", "group_size": 3},
+        {"match_mode": "팀 매칭 (친구와 함께)", "group_size": 2, "team_code": "같은팀"},
+        {"match_mode": "팀 매칭 (친구와 함께)", "group_size": 2, "team_code": np.nan},
+        {"match_mode": "팀 매칭 (친구와 함께)", "group_size": 2, "team_code": " 같은팀 "},
+        {"purpose": np.nan},
+    ]
+    raw = df[main.PROFILE_COLUMNS]
+    rows = []
+    for i, edit in enumerate(edits * 3):
+        row = raw.iloc[rng.randrange(len(raw))].to_dict()
+        row.update(edit)
+        row["user_id"] = f"edge{i}"
+        rows.append(row)
+    edge = pd.DataFrame(rows, columns=main.PROFILE_COLUMNS)
+    return main.add_score_columns(pd.concat([raw, edge], ignore_index=True))
+
+
+def _expected(me, others):
+    return np.array([main.calc_match_score(me, other) for _, other in others.iterrows()], dtype=float)
+
+
+def test_score_candidates_matches_calc_match_score(profiles):
+    df = _edge_cases(profiles)
+    rng = random.Random(1)
+    mismatches = []
+    for pos in rng.sample(range(len(df)), 40) + list(range(len(profiles), len(df), 3)):
+        me = df.iloc[pos]
+        got = main.score_candidates(me, df).to_numpy()
+        want = _expected(me, df)
+        bad = ~np.isclose(got, want)
+        mismatches += [(me["user_id"], df["user_id"].iloc[j], got[j], want[j]) for j in np.flatnonzero(bad)]
+    assert mismatches == []
+
+
+def test_score_pairs_and_matrix_agree(profiles):
+    df = _edge_cases(profiles, seed=1)
+    left = df.sample(60, random_state=2)
+    right = df.sample(60, random_state=3)
+    pairs = main.score_pairs(left, right)
+    want = np.array([main.calc_match_score(a, b) for (_, a), (_, b) in zip(left.iterrows(), right.iterrows())])
+    assert np.allclose(pairs, want)
+    matrix = main.score_matrix(left, right)
+    assert matrix.shape == (60, 60)
+    assert np.allclose(np.diag(matrix), want)
+    assert np.allclose(matrix[5], main.score_candidates(left.iloc[5], right).to_numpy())
+
+
+def _person(user_id, **edit):
+    row = {
+        "timestamp": "2026-01-01T00:00:00", "user_id": user_id, "purpose": "친구",
+        "match_mode": "1:1 매칭", "group_size": np.nan, "group_scope": "전체 공개", "group_name": np.nan,
+        "self_age": 25, "self_gender": "여성", "self_height": 165,
+        "self_personality": "차분함;유머있음", "self_appearance": "강아지상", "self_body_type": "보통",
+        "pref_min_age": 20, "pref_max_age": 30, "pref_gender": "상관없음",
+        "pref_min_height": 150, "pref_max_height": 190,
+        "pref_personality": "유머있음", "pref_appearance": "상관없음", "pref_body_type": "상관없음",
+        "blacklist_personality": np.nan, "blacklist_appearance": np.nan,
+    }
+    row.update(edit)
+    return row
+
+
+def test_excluded_pairs_score_minus_one(profiles):
+    people = pd.DataFrame([
+        _person("me", pref_gender="남성", blacklist_personality="즉흥적"),
+        _person("compatible", self_gender="남성"),
+        _person("wrong_gender", self_gender="여성"),
+        _person("blacklisted", self_gender="남성", self_personality="즉흥적;유머있음"),
+        _person("other_group", self_gender="남성", group_scope="특정 그룹 내에서", group_name="학교B"),
+    ], columns=main.PROFILE_COLUMNS)
+    df = main.add_score_columns(people)
+    scores = dict(zip(df["user_id"], main.score_candidates(df.iloc[0], df)))
+    assert scores["compatible"] > 0
+    assert scores["wrong_gender"] == -1
+    assert scores["blacklisted"] == -1
+    assert scores["other_group"] == -1
+    for _, other in df.iterrows():
+        assert main.calc_match_score(df.iloc[0], other) == pytest.approx(scores[other["user_id"]])
+
+    # 내가 "특정 그룹 내에서" 이면 다른 그룹 사람은 제외, 같은 그룹 사람은 남는다
+    restricted = pd.DataFrame([
+        _person("me", group_scope="특정 그룹 내에서", group_name="학교A"),
+        _person("same_group", group_name="학교A"),
+        _person("other_group", group_name="학교B"),
+    ], columns=main.PROFILE_COLUMNS)
+    df = main.add_score_columns(restricted)
+    scores = dict(zip(df["user_id"], main.score_candidates(df.iloc[0], df)))
+    assert scores["same_group"] > 0
+    assert scores["other_group"] == -1
+
+    # 같은 팀 코드끼리는 팀 매칭에서 제외
+    df = _edge_cases(profiles)
+    team = df[(df["team_code"] == "같은팀")]
+    assert (main.score_matrix(team, team) == -1).all()
+
+
+def test_more_than_64_tags_still_match_calc_match_score(profiles, caplog):
+    # 성격 태그가 64 개를 넘으면 넘친 태그가 있는 줄은 calc_match_score 로 계산한다
+    main.get_tag_vocab.clear()
+    try:
+        raw = profiles[main.PROFILE_COLUMNS].copy()
+        tags = [f"새성격{i}" for i in range(80)]
+        raw["self_personality"] = [f"{tags[i % 80]};{tags[(i * 7) % 80]}" for i in range(len(raw))]
+        raw.loc[raw.index[::2], "pref_personality"] = ";".join(tags[60:])
+        raw.loc[raw.index[::5], "blacklist_personality"] = ";".join(tags[70:75])
+        with caplog.at_level("WARNING", logger="souly"):
+            df = main.add_score_columns(raw)
+        assert "tag bits full" in caplog.text
+        assert df["_tag_overflow"].any() and not df["_tag_overflow"].all()
+
+        for pos in range(0, 40, 3):
+            me = df.iloc[pos]
+            assert np.allclose(main.score_candidates(me, df).to_numpy(), _expected(me, df))
+        left, right = df.iloc[:30], df.iloc[30:60]
+        want = np.array([main.calc_match_score(a, b) for (_, a), (_, b) in zip(left.iterrows(), right.iterrows())])
+        assert np.allclose(main.score_pairs(left, right), want)
+        assert np.allclose(np.diag(main.score_matrix(left, right)), want)
+    finally:
+        main.get_tag_vocab.clear()
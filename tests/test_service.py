@@ -0,0 +1,23 @@
+# ------------------------------
+# service_* 입력 검사: 잘못된 값은 ValueError (API 400).
+# ------------------------------
+import pytest
+
+import main
+
+
+@pytest.fixture()
+def local(workdir, monkeypatch):
+    monkeypatch.setattr(main, "WRITE_BEHIND", False)
+
+
+@pytest.mark.parametrize("rating", [9.7, True, False, "1.5", "", None, "١", 0, 11, "11"])
+def test_rate_rejects_non_integer_ratings(local, rating):
+    with pytest.raises(ValueError, match="1~10 정수"):
+        main.service_rate({"from_user": "a", "to_user": "b", "rating": rating})
+
+
+@pytest.mark.parametrize("rating, stored", [(7, 7), ("8", 8), (" 9 ", 9), (10.0, 10)])
+def test_rate_accepts_integers(local, rating, stored):
+    main.service_rate({"from_user": "a", "to_user": "b", "rating": rating})
+    assert main.get_rating_index().get("a", "b") == stored
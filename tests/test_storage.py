@@ -0,0 +1,37 @@
+# ------------------------------
+# CsvStorage 이벤트 로그: 쓰다 끊긴 줄이 있어도 그 뒤에 쓴 이벤트는 다시 읽기 / 압축 후에도 남는다.
+# ------------------------------
+import main
+
+
+def _rating(rater, target, rating):
+    return {"timestamp": "t", "from_user": rater, "to_user": target, "rating": rating}
+
+
+def _pairs(df):
+    return {(r.from_user, r.to_user): int(r.rating) for r in df.itertuples()}
+
+
+def test_append_after_torn_tail_survives_replay_and_compaction(workdir):
+    storage = main.CsvStorage()
+    storage.append_event("ratings", _rating("a", "b", 7))
+    with open("ratings.log", "a", encoding="utf-8") as f:
+        f.write("t2,c,d,1")  # 줄바꿈 전에 끊긴 쓰기
+    storage.append_event("ratings", _rating("e", "f", 5))
+
+    assert _pairs(storage.load("ratings")) == {("a", "b"): 7, ("e", "f"): 5}
+    main.compact_logs()
+    assert _pairs(main.CsvStorage().load("ratings")) == {("a", "b"): 7, ("e", "f"): 5}
+
+
+def test_replay_skips_invalid_values(workdir):
+    storage = main.CsvStorage()
+    storage.append_event("decisions", {"timestamp": "t", "from_user": "a", "to_user": "b", "decision": "수락"})
+    storage.append_event("ratings", _rating("a", "b", 10))
+    with open("decisions.log", "a", encoding="utf-8") as f:
+        f.write("t,a,c,뭐\n")
+    with open("ratings.log", "a", encoding="utf-8") as f:
+        f.write("t,a,c,11\nt,a,d,abc\nt,a,e,2.5\n")
+
+    assert list(storage.load("decisions")["to_user"]) == ["b"]
+    assert _pairs(storage.load("ratings")) == {("a", "b"): 10}
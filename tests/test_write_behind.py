@@ -0,0 +1,102 @@
+# ------------------------------
+# WriteBehind / TableCache: 아직 안 쓴 줄도 바로 읽히고, 종료할 때 남은 줄이 저장소에 쓰이는지.
+# ------------------------------
+import os
+import subprocess
+import sys
+
+import pytest
+
+import main
+
+
+def _rating(rater, target, rating):
+    return {"timestamp": "t", "from_user": rater, "to_user": target, "rating": rating}
+
+
+def _decision(sender, target, decision):
+    return {"timestamp": "t", "from_user": sender, "to_user": target, "decision": decision}
+
+
+@pytest.fixture()
+def queue(workdir, monkeypatch):
+    # 뒤쪽 스레드가 끼어들지 않게 오래 기다리는 큐
+    q = main.WriteBehind(batch=1000, interval_ms=60_000)
+    monkeypatch.setattr(main, "WRITE_BEHIND", True)
+    monkeypatch.setattr(main, "get_write_queue", lambda: q)
+    yield q
+    q.close()
+
+
+def test_pending_rows_are_read_back_before_flush(queue):
+    main.upsert_rating(_rating("a", "b", 8))
+    main.upsert_decision(_decision("a", "b", "수락"))
+
+    assert len(main.get_storage().load("ratings")) == 0
+    assert main.get_rating_index().get("a", "b") == 8
+    assert list(main.load_decisions()["to_user"]) == ["b"]
+
+    assert main.flush_writes() == 2
+    assert len(main.get_storage().load("ratings")) == 1
+    assert main.get_rating_index().get("a", "b") == 8
+
+
+def test_close_writes_queued_rows(queue):
+    for i in range(5):
+        main.upsert_rating(_rating(f"a{i}", "b", 4))
+    queue.close()
+    assert sorted(main.get_storage().load("ratings")["from_user"]) == [f"a{i}" for i in range(5)]
+
+
+def test_close_falls_back_to_single_rows(queue, monkeypatch):
+    storage = main.get_storage()
+    upsert_many = storage.upsert_many
+    calls = []
+
+    def flaky(table, rows):
+        calls.append(len(rows))
+        if len(rows) > 1:
+            raise OSError("disk full")
+        return upsert_many(table, rows)
+
+    monkeypatch.setattr(storage, "upsert_many", flaky)
+    for i in range(3):
+        main.upsert_rating(_rating(f"a{i}", "b", 6))
+    queue.close()
+    assert calls == [3, 1, 1, 1]
+    assert len(storage.load("ratings")) == 3
+
+
+def test_atexit_flushes_queued_rows(workdir):
+    code = (
+        "import main\n"
+        "for i in range(10):\n"
+        "    main.upsert_rating({'timestamp': 't', 'from_user': f'x{i}', 'to_user': 'b', 'rating': 5})\n"
+    )
+    env = {**os.environ, "PYTHONPATH": main.__file__.rsplit("/", 1)[0], "SOULY_WRITE_BEHIND_MS": "60000"}
+    subprocess.run([sys.executable, "-c", code], cwd=workdir, env=env, check=True, capture_output=True)
+    assert len(main.get_storage().load("ratings")) == 10
+
+
+def test_positions_survive_merge_and_reload(workdir, monkeypatch):
+    monkeypatch.setattr(main, "WRITE_BEHIND", False)
+    for i in range(20):
+        main.upsert_decision(_decision(f"a{i}", "b", "수락"))
+    main.get_decision_index()
+    cache = main.get_table_cache()
+    for rnd in range(3):
+        main.upsert_decision(_decision(f"a{rnd}", "b", "거절"))
+        main.load_decisions()  # overlay 를 표에 합친다
+        entry = cache.entries["decisions"]
+        assert entry["positions"] is not None
+        assert cache._old_row(entry, "decisions", (f"a{rnd}", "b"))["decision"] == "거절"
+        assert cache._old_row(entry, "decisions", ("a19", "b"))["decision"] == "수락"
+    main.upsert_decision(_decision("a1", "b", "수락"))
+
+    cached = main.load_decisions()
+    assert list(cached.index) == list(range(20))
+    cache.invalidate()
+    fresh = main.load_decisions()
+    assert cached.equals(fresh)
+    assert main.get_decision_index().get("a0", "b") == "거절"
+    assert main.get_decision_index().get("a1", "b") == "수락"